@@ -1,5 +1,150 @@
-from django.contrib import admin
+import datetime
 
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db.models.expressions import RawSQL
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import archive, bulk, search
 from .models import Post
 
-admin.site.register(Post)
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Never counts the whole post table: the total comes from the archive's
+    month counts (see blog/archive.py), and filtered counts stop at
+    ``max_count``, so pages past it are not offered.
+    """
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list, self.max_count)
+
+
+def estimate_count(queryset, max_count):
+    if not queryset.query.where:
+        return archive.total()
+    return queryset.order_by()[:max_count].count()
+
+
+class DateRangeChangeList(ChangeList):
+    """
+    Applies the date hierarchy's ``__year``, ``__month`` and ``__day``
+    parameters as a range on the indexed date column instead of extracting
+    the parts from every row.
+    """
+    def get_filters_params(self, params=None):
+        lookup_params = super(DateRangeChangeList, self).get_filters_params(params)
+        self.date_range = None
+        if self.date_hierarchy:
+            parts = [lookup_params.pop('%s__%s' % (self.date_hierarchy, part), None)
+                     for part in ('year', 'month', 'day')]
+            if parts[0]:
+                try:
+                    self.date_range = date_range(*parts)
+                except (TypeError, ValueError) as e:
+                    raise IncorrectLookupParameters(e)
+        return lookup_params
+
+    def get_queryset(self, request):
+        queryset = super(DateRangeChangeList, self).get_queryset(request)
+        if self.date_range:
+            start, end = self.date_range
+            queryset = queryset.filter(**{'%s__gte' % self.date_hierarchy: start,
+                                          '%s__lt' % self.date_hierarchy: end})
+        return queryset
+
+
+def date_range(year, month=None, day=None):
+    """
+    Returns the aware ``[start, end)`` of a year, month or day.
+    """
+    if not month:
+        return archive.month_range(int(year))
+    if not day:
+        return archive.month_range(int(year), int(month))
+    start = datetime.datetime(int(year), int(month), int(day))
+    end = start + datetime.timedelta(days=1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+class PostAdmin(admin.ModelAdmin):
+    """
+    Changelist tuned for millions of posts: only indexed columns sort,
+    search goes through the full-text index instead of ``LIKE``, the date
+    hierarchy reads the archive counts (see admin/blog/post/change_list.html)
+    and the actions are batched set-based queries (see blog/bulk.py).
+    """
+    list_display = ('post_title', 'created_date', 'last_modified', 'view_count')
+    list_display_links = ('post_title',)
+    ordering = ('-created_date', '-id')
+    date_hierarchy = 'created_date'
+    search_fields = ('title', 'description')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    actions = ['delete_posts', 'reset_view_counts']
+
+    # Unsortable: sorting by them would scan and sort the whole table.
+    def post_title(self, post):
+        return post.title
+    post_title.short_description = 'title'
+
+    def last_modified(self, post):
+        return post.modified_date
+    last_modified.short_description = 'modified date'
+
+    def get_changelist(self, request, **kwargs):
+        return DateRangeChangeList
+
+    def get_actions(self, request):
+        actions = super(PostAdmin, self).get_actions(request)
+        # Loads and deletes posts one by one.
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        match = search.build_match_query(search_term)
+        if not match:
+            return queryset, False
+        fts = RawSQL('SELECT rowid FROM %s WHERE %s MATCH %%s' % (search.FTS_TABLE, search.FTS_TABLE),
+                     [match])
+        return queryset.filter(pk__in=fts), False
+
+    def delete_posts(self, request, queryset):
+        if not self.has_delete_permission(request):
+            raise PermissionDenied
+        if request.POST.get('post'):
+            count = bulk.delete_posts(queryset)
+            self.message_user(request, "Deleted %d posts." % count, messages.SUCCESS)
+            return None
+        opts = self.model._meta
+        context = dict(
+            self.admin_site.each_context(request),
+            title="Are you sure?",
+            opts=opts,
+            count=estimate_count(queryset, EstimatedCountPaginator.max_count),
+            max_count=EstimatedCountPaginator.max_count,
+            sample=queryset.only('id', 'title')[:10],
+            select_across=request.POST.get('select_across'),
+            selected=request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            action_checkbox_name=helpers.ACTION_CHECKBOX_NAME,
+        )
+        request.current_app = self.admin_site.name
+        return TemplateResponse(request, 'admin/blog/post/delete_posts_confirmation.html', context)
+    delete_posts.short_description = "Delete selected posts"
+
+    def reset_view_counts(self, request, queryset):
+        count = queryset.update(view_count=0)
+        self.message_user(request, "Reset the view counts of %d posts." % count, messages.SUCCESS)
+    reset_view_counts.short_description = "Reset view counts of selected posts"
+
+
+admin.site.register(Post, PostAdmin)
@@ -0,0 +1,102 @@
+"""
+Admission control for writes (see blog.middleware.AdmissionControlMiddleware).
+
+SQLite has a single writer, so a burst of writes queues up on its lock
+and every request waiting on it, reads included, holds a worker.  Two
+limits keep writes from taking the site down:
+
+- A token bucket per client, in the blog cache so every worker sharing
+  it shares the buckets: ``BLOG_ADMISSION_BURST`` writes at once, then
+  ``BLOG_ADMISSION_RATE`` per second.  Over it, a write is refused with
+  429 and the seconds until the next token.  The bucket is read and
+  written without a lock, so concurrent writes of one client may both
+  take its last token; close enough for shedding load.
+- A per-process cap of ``BLOG_ADMISSION_MAX_WRITES`` writes in flight.
+  Up to ``BLOG_ADMISSION_QUEUE`` more wait at most
+  ``BLOG_ADMISSION_QUEUE_TIMEOUT`` seconds for a slot; the rest, and
+  those that time out, are refused with 503 right away.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from . import cache
+
+BUCKET_KEY = 'blog:admission:bucket:%s'
+
+
+def take_token(client, rate, burst, now=None):
+    """
+    Takes a token from the bucket of ``client``.  Returns 0 if there was
+    one, else the seconds until there will be.
+    """
+    now = time.time() if now is None else now
+    key = BUCKET_KEY % client
+    tokens, stamp = cache.get_cache().get(key) or (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - stamp) * rate)
+    wait = 0.0
+    if tokens >= 1:
+        tokens -= 1
+    else:
+        wait = (1 - tokens) / rate
+    # Expires once full again: a missing bucket is a full one.
+    cache.get_cache().set(key, (tokens, now), int(math.ceil((burst - tokens) / rate)) + 1)
+    return wait
+
+
+class WriteGate(object):
+    """
+    Lets ``limit`` writes in at a time, with up to ``queue_size`` more
+    waiting for their turn.
+    """
+    def __init__(self, limit, queue_size):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+
+    def acquire(self, timeout):
+        """
+        Returns the seconds waited for a slot, or None if the queue was
+        full or the wait timed out.  Admitted writes must ``release()``.
+        """
+        with self.condition:
+            if self.in_flight < self.limit and not self.waiting:
+                self.in_flight += 1
+                return 0.0
+            if self.waiting >= self.queue_size:
+                return None
+            start = time.time()
+            deadline = start + timeout
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.limit:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            return time.time() - start
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def get_gate():
+    limit = getattr(settings, 'BLOG_ADMISSION_MAX_WRITES', 4)
+    queue_size = getattr(settings, 'BLOG_ADMISSION_QUEUE', 8)
+    with _gates_lock:
+        if (limit, queue_size) not in _gates:
+            _gates[limit, queue_size] = WriteGate(limit, queue_size)
+        return _gates[limit, queue_size]
@@ -0,0 +1,114 @@
+"""
+Post counts per month, for the archive sidebar and pages.
+
+Instead of a ``GROUP BY`` over every post on each render, the counts live
+in the small ArchiveMonth table, adjusted with ``F()`` updates by the
+post signals (and per batch by the bulk import), so the sidebar is a
+single indexed read, cached until the counts change.  ``rebuild``
+recounts everything, for writes that bypass both, e.g.
+``QuerySet.update()`` of ``created_date``.
+
+Months are those of the current time zone.  Cached pages follow the
+archive version (blog/cache.py); pre-rendered pages keep the sidebar of
+when they were rendered.
+"""
+import collections
+import datetime
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import cache
+from .models import ArchiveMonth, Post
+
+
+def month_of(value):
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.year, value.month
+
+
+def month_range(year, month=None):
+    """
+    Returns the aware ``[start, end)`` datetimes of a month, or of the
+    whole year when ``month`` is None.
+    """
+    start = datetime.datetime(year, month or 1, 1)
+    if month is None or month == 12:
+        end = datetime.datetime(year + 1, 1, 1)
+    else:
+        end = datetime.datetime(year, month + 1, 1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+def add(dates, delta=1, using=None):
+    """
+    Counts ``delta`` more posts for the month of each of ``dates``.
+    """
+    using = using or router.db_for_write(ArchiveMonth)
+    counts = collections.Counter(month_of(date) for date in dates)
+    if not counts:
+        return
+    months = ArchiveMonth.objects.using(using)
+    with transaction.atomic(using=using):
+        for (year, month), count in counts.items():
+            change = count * delta
+            if months.filter(year=year, month=month).update(count=F('count') + change):
+                continue
+            if change > 0:
+                try:
+                    with transaction.atomic(using=using):
+                        months.create(year=year, month=month, count=change)
+                except IntegrityError:
+                    # Created concurrently.
+                    months.filter(year=year, month=month).update(count=F('count') + change)
+        if delta < 0:
+            months.filter(count__lte=0).delete()
+    # Not before the caller's transaction commits, or a request in between
+    # would cache the old counts under the new version.
+    transaction.on_commit(cache.invalidate_archive, using=using)
+
+
+def months():
+    """
+    Returns the months with posts, newest first, cached under the archive
+    version.
+    """
+    key = cache.archive_months_key()
+    result = cache.get_cache().get(key)
+    if result is None:
+        result = list(ArchiveMonth.objects.order_by('-year', '-month'))
+        cache.set_page(key, result)
+    return result
+
+
+def total():
+    """
+    Returns the number of posts, without counting them.
+    """
+    return sum(month.count for month in months())
+
+
+def rebuild(queryset=None, chunk_size=1000):
+    """
+    Recounts the posts of ``queryset`` per month from scratch, reading
+    ``chunk_size`` rows per query.  Returns the number of months.
+    """
+    from .bulk import iterate_posts
+
+    if queryset is None:
+        queryset = Post.objects.all()
+    # Counted on the database written to, not a lagging replica.
+    using = queryset._db or router.db_for_write(ArchiveMonth)
+    queryset = queryset.using(using)
+    counts = collections.Counter(
+        month_of(row['created_date'])
+        for row in iterate_posts(queryset, fields=('created_date',), chunk_size=chunk_size))
+    with transaction.atomic(using=using):
+        ArchiveMonth.objects.using(using).all().delete()
+        ArchiveMonth.objects.using(using).bulk_create(
+            ArchiveMonth(year=year, month=month, count=count)
+            for (year, month), count in counts.items())
+    cache.invalidate_archive()
+    return len(counts)
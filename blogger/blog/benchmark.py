@@ -0,0 +1,261 @@
+"""
+Latency benchmark of the blog views.
+
+``seed_posts`` fills the database with ``bulk_create``, ``run`` drives
+every route of blog/urls.py through the test client and measures
+latency percentiles, throughput and queries per request, and ``compare``
+checks the results against a stored baseline.  The ``benchmark``
+management command ties them together on a throwaway test database.
+"""
+import datetime
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import archive, bulk, cache, search, tagging
+from .metrics import percentile
+from .models import Post, PostTag, Tag
+from .pagination import encode_cursor
+from .urls import urlpatterns
+
+WORDS = ('python', 'django', 'sqlite', 'cache', 'index', 'cursor', 'query',
+         'latency', 'stream', 'feed', 'search', 'template', 'worker', 'shard')
+
+
+# Every seeded post gets one or two of these.
+TAGS = ('Python', 'Django', 'SQLite', 'Caching', 'Performance')
+
+# Requested as this user, created on the fly.
+STAFF_USERNAME = 'benchmark'
+
+
+def seed_posts(count, batch_size=10000, seed=0):
+    """
+    Inserts ``count`` posts spread over the last ``count`` minutes, tags
+    them and indexes them for search.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    def posts():
+        for i in range(count):
+            words = rng.sample(WORDS, 4)
+            yield Post(
+                title=' '.join(words[:2]).title(),
+                description='A post about %s.' % ', '.join(words),
+                created_date=now - datetime.timedelta(minutes=count - i),
+            )
+
+    for batch in bulk.batched(posts(), batch_size):
+        with transaction.atomic():
+            Post.objects.bulk_create(batch)
+    tags = tagging.get_tags(TAGS)
+
+    def post_tags():
+        for row in bulk.iterate_posts(fields=('created_date',), chunk_size=batch_size):
+            for tag in rng.sample(tags, rng.randint(1, 2)):
+                yield PostTag(post_id=row['id'], tag=tag, created_date=row['created_date'])
+
+    for batch in bulk.batched(post_tags(), batch_size):
+        with transaction.atomic():
+            PostTag.objects.bulk_create(batch)
+    tagging.rebuild()
+    search.rebuild()
+    archive.rebuild()
+    cache.invalidate_list()
+
+
+class Scenarios(object):
+    """
+    One request per blog route, keyed by url name.  Every call returns the
+    arguments for one ``Client`` request, from ``staff_client()`` for the
+    ``staff_only`` routes.
+    """
+    staff_only = ('stats', 'bulk-update', 'bulk-delete')
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        bounds = Post.objects.aggregate(low=Min('id'), high=Max('id'))
+        self.low, self.high = bounds['low'] or 0, bounds['high'] or 0
+        # A cursor near the oldest post, to show deep pages cost the same.
+        oldest = Post.objects.order_by('created_date', 'id').first()
+        self.deep_cursor = oldest and encode_cursor(oldest.created_date, oldest.pk)
+        newest = archive.months()[:1]
+        now = timezone.now()
+        self.year, self.month = (newest[0].year, newest[0].month) if newest else (now.year, now.month)
+        tag = Tag.objects.order_by('-post_count', '-id').first()
+        self.tag_slug = tag.slug if tag else 'untagged'
+
+    def pk(self):
+        return self.rng.randint(self.low, self.high)
+
+    def list(self):
+        return 'get', reverse('blog:list'), {}
+
+    def list_deep(self):
+        return 'get', reverse('blog:list'), {'cursor': self.deep_cursor} if self.deep_cursor else {}
+
+    def details(self):
+        return 'get', reverse('blog:details', args=(self.pk(),)), {}
+
+    def archive_year(self):
+        return 'get', reverse('blog:archive-year', args=(self.year,)), {}
+
+    def archive_month(self):
+        return 'get', reverse('blog:archive-month', args=(self.year, '%02d' % self.month)), {}
+
+    def tag(self):
+        return 'get', reverse('blog:tag', args=(self.tag_slug,)), {}
+
+    def popular(self):
+        return 'get', reverse('blog:popular'), {}
+
+    def search(self):
+        return 'get', reverse('blog:search'), {'q': self.rng.choice(WORDS)}
+
+    def api_posts(self):
+        return 'get', reverse('blog:api-posts'), {'limit': 100}
+
+    def feed_rss(self):
+        return 'get', reverse('blog:feed-rss'), {}
+
+    def feed_atom(self):
+        return 'get', reverse('blog:feed-atom'), {}
+
+    def sitemap(self):
+        return 'get', reverse('blog:sitemap'), {}
+
+    def sitemap_shard(self):
+        return 'get', reverse('blog:sitemap-shard', args=(cache.sitemap_shard(self.pk() or 1),)), {}
+
+    def stats(self):
+        return 'get', reverse('blog:stats'), {}
+
+    def create(self):
+        return 'post', reverse('blog:create'), {
+            'title': 'Benchmark post',
+            'description': 'Created by the benchmark.',
+        }
+
+    def update(self):
+        return 'post', reverse('blog:update', args=(self.pk(),)), {
+            'title': 'Updated benchmark post',
+            'description': 'Updated by the benchmark.',
+        }
+
+    def delete(self):
+        # Only the confirmation page, deleting would shrink the data set.
+        return 'get', reverse('blog:delete', args=(self.pk(),)), {}
+
+    def bulk_update(self):
+        return 'post', reverse('blog:bulk-update'), {'ids': self.pk(), 'description': 'Bulk updated.'}
+
+    def bulk_delete(self):
+        # Runs last, so deleting a post per request shrinks no other
+        # scenario's data set.
+        return 'post', reverse('blog:bulk-delete'), {'ids': self.pk()}
+
+    def names(self):
+        """
+        Returns the scenario names, which include every named blog route.
+        """
+        routes = [pattern.name for pattern in urlpatterns if pattern.name]
+        missing = [name for name in routes if not hasattr(self, name.replace('-', '_'))]
+        if missing:
+            raise ValueError("No benchmark scenario for: %s." % ', '.join(missing))
+        return routes[:1] + ['list-deep'] + routes[1:]
+
+    def get(self, name):
+        return getattr(self, name.replace('-', '_'))
+
+
+def staff_client():
+    """
+    Returns a ``Client`` logged in as a staff user, for the staff only
+    routes.
+    """
+    user, created = User.objects.get_or_create(username=STAFF_USERNAME, defaults={'is_staff': True})
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def run(requests=100, names=None, cold=False, seed=0):
+    """
+    Sends ``requests`` requests per scenario and returns a dict of
+    latency (ms), throughput (requests/s) and queries per request stats.
+    Every request comes from the same client, so the per-client write
+    rate limit is off meanwhile.
+    """
+    with override_settings(BLOG_ADMISSION_RATE=None):
+        return _run(requests, names, cold, seed)
+
+
+def _run(requests, names, cold, seed):
+    scenarios = Scenarios(seed)
+    names = names or scenarios.names()
+    anonymous = Client()
+    staff = staff_client() if set(names) & set(scenarios.staff_only) else None
+    results = {}
+    for name in names:
+        scenario = scenarios.get(name)
+        client = staff if name in scenarios.staff_only else anonymous
+        latencies = []
+        queries = 0
+        errors = 0
+        started = time.time()
+        for i in range(requests):
+            if cold:
+                cache.get_cache().clear()
+            method, path, data = scenario()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.time()
+                response = getattr(client, method)(path, data)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                latencies.append((time.time() - start) * 1000)
+            queries += len(captured)
+            # Redirects are expected: after a write, or to the login page.
+            if response.status_code >= 400:
+                errors += 1
+        elapsed = time.time() - started
+        latencies.sort()
+        results[name] = {
+            'requests': requests,
+            'errors': errors,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+            'throughput': requests / elapsed if elapsed else 0.0,
+            'queries': float(queries) / requests if requests else 0.0,
+        }
+    return results
+
+
+def compare(results, baseline, latency_threshold=0.2, query_threshold=0.0):
+    """
+    Returns a list of regressions of ``results`` against ``baseline``: a
+    p95 slower by more than ``latency_threshold`` (a fraction), or more
+    than ``query_threshold`` extra queries per request.
+    """
+    regressions = []
+    for name, stats in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        limit = base['p95'] * (1 + latency_threshold)
+        if stats['p95'] > limit:
+            regressions.append("%s: p95 %.2fms > %.2fms (baseline %.2fms)" % (
+                name, stats['p95'], limit, base['p95']))
+        if stats['queries'] > base['queries'] + query_threshold:
+            regressions.append("%s: %.2f queries/request > %.2f (baseline)" % (
+                name, stats['queries'], base['queries'] + query_threshold))
+    return regressions
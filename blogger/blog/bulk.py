@@ -0,0 +1,424 @@
+"""
+Streaming bulk import and export of posts.
+
+Everything here works on iterators so memory stays flat no matter how
+large the file is: input is parsed one line at a time and written with
+``bulk_create`` in fixed size batches, and output is read in keyset
+chunks by id (the SQLite backend cannot stream a single cursor, so a
+plain ``iterator()`` over the whole table would still buffer every row).
+"""
+import collections
+import csv
+import json
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, router, transaction
+from django.db.models import Max
+from django.utils import six, timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_text
+
+from . import archive, cache, markup, search, tagging
+from .models import Post, PostBody, PostTag
+
+# Columns of the posts table, see iterate_posts.
+POST_FIELDS = ('id', 'title', 'description', 'created_date', 'modified_date')
+# Exported and imported: also the Markdown body and the comma separated
+# tag names, so an export can be imported back as a backup.
+FIELDS = POST_FIELDS + ('body', 'tags')
+FORMATS = ('jsonl', 'csv')
+
+
+class InvalidRow(ValueError):
+    def __init__(self, line, message, last_line=None):
+        if last_line is not None and last_line != line:
+            prefix = "Lines %d-%d" % (line, last_line)
+        else:
+            prefix = "Line %d" % line
+        super(InvalidRow, self).__init__("%s: %s" % (prefix, message))
+        self.line = line
+
+
+def guess_format(path, default='jsonl'):
+    for format in FORMATS:
+        if path.endswith('.' + format):
+            return format
+    return default
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Progress(object):
+    """
+    Counts rows and reports the running total and rate to ``callback``
+    every ``every`` rows.
+    """
+    def __init__(self, callback=None, every=10000):
+        self.callback = callback
+        self.every = every
+        self.count = 0
+        self.start = time.time()
+        self._next_report = every
+
+    @property
+    def rate(self):
+        elapsed = time.time() - self.start
+        return self.count / elapsed if elapsed else 0.0
+
+    def add(self, count):
+        self.count += count
+        if self.callback and self.count >= self._next_report:
+            self._next_report = self.count + self.every
+            self.callback(self)
+
+    def done(self):
+        if self.callback:
+            self.callback(self)
+
+
+# Readers yield one dict of text values per line.
+
+def read_jsonl(stream):
+    for line in stream:
+        line = force_text(line).strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield dict((force_text(key), force_text(value)) for key, value in row.items())
+
+
+# Writers take an iterable of ``values()`` dicts.
+
+def _serialize(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def write_jsonl(stream, rows, fields=FIELDS):
+    for row in rows:
+        line = json.dumps(dict((field, _serialize(row[field])) for field in fields))
+        stream.write(force_text(line) + '\n')
+        yield row
+
+
+def write_csv(stream, rows, fields=FIELDS):
+    # The csv module wants bytes on Python 2 and text on Python 3.
+    encode = force_bytes if six.PY2 else force_text
+    writer = csv.writer(stream)
+    writer.writerow([encode(field) for field in fields])
+    for row in rows:
+        writer.writerow([encode(_serialize(row[field])) for field in fields])
+        yield row
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+WRITERS = {'jsonl': write_jsonl, 'csv': write_csv}
+
+
+def build_post(line, row, now):
+    """
+    Returns an unsaved ``Post`` for one input row, validated like the form
+    would, and the names of its tags, or raises ``InvalidRow``.
+    """
+    if not isinstance(row, dict):
+        raise InvalidRow(line, "Not an object.")
+    body, tags = row.get('body') or '', row.get('tags') or ''
+    for field, value in (('body', body), ('tags', tags)):
+        if not isinstance(value, six.string_types):
+            raise InvalidRow(line, "Invalid %s." % field)
+    created_date = row.get('created_date') or None
+    if created_date is not None:
+        try:
+            created_date = parse_datetime(created_date)
+        except (TypeError, ValueError) as e:
+            # Well formed, but out of range.
+            raise InvalidRow(line, "Invalid created_date: %s." % e)
+        if created_date is None:
+            raise InvalidRow(line, "Invalid created_date.")
+        if timezone.is_naive(created_date):
+            created_date = timezone.make_aware(created_date, timezone.utc)
+    post = Post(
+        id=row.get('id') or None,
+        title=row.get('title', ''),
+        description=row.get('description', ''),
+        created_date=created_date or now,
+    )
+    post.body = body
+    try:
+        post.clean_fields()
+    except ValidationError as e:
+        raise InvalidRow(line, "; ".join(
+            "%s: %s" % (field, " ".join(errors))
+            for field, errors in sorted(e.message_dict.items())))
+    return post, tagging.parse_tags(tags)
+
+
+def import_posts(rows, batch_size=1000, progress=None, using=None):
+    """
+    Inserts posts for ``rows``, their bodies and tags with one
+    ``bulk_create`` each and one transaction per batch, indexing each
+    batch for search in the same transaction, and refreshes the page
+    cache once at the end, even if a batch failed.  Returns the number of
+    posts imported.
+
+    A bad row, or one clashing with an existing post, aborts its batch
+    with ``InvalidRow``; earlier batches stay committed.
+    """
+    using = using or router.db_for_write(Post)
+    posts_manager = Post.objects.using(using)
+    progress = progress or Progress()
+    now = timezone.now()
+    # Sitemap shards of the imported posts.
+    shards = set()
+    try:
+        for batch in batched(enumerate(rows, 1), batch_size):
+            built = [build_post(line, row, now) for line, row in batch]
+            posts = [post for post, names in built]
+            try:
+                with transaction.atomic(using=using):
+                    last_pk = posts_manager.aggregate(last_pk=Max('id'))['last_pk'] or 0
+                    posts_manager.bulk_create(posts)
+                    _set_new_pks(posts, last_pk, using)
+                    search.index_after(last_pk, using=using)
+                    search.index_posts([post for post in posts if post.pk <= last_pk], using=using)
+                    PostBody.objects.using(using).bulk_create(
+                        [_render(PostBody(post=post, text=post.body)) for post in posts if post.body])
+                    tagging.tag_new_posts(built, using=using)
+                    archive.add([post.created_date for post in posts], using=using)
+            except IntegrityError as e:
+                # e.g. an id already taken, by another post or within the batch.
+                raise InvalidRow(batch[0][0], "%s." % e, batch[-1][0])
+            shards.update(cache.sitemap_shard(post.pk) for post in posts)
+            progress.add(len(posts))
+    finally:
+        # Also when a batch fails: the ones before it are committed.
+        if progress.count:
+            cache.invalidate_list()
+            cache.invalidate_sitemap(shards)
+    progress.done()
+    return progress.count
+
+
+def _set_new_pks(posts, last_pk, using):
+    """
+    Sets the ids of the ``posts`` just inserted without one: bulk_create
+    does not return them on SQLite, but new rows always land above the
+    previous maximum id ``last_pk``, in order.
+    """
+    new = [post for post in posts if post.pk is None]
+    if new:
+        given = set(post.pk for post in posts if post.pk is not None)
+        pks = Post.objects.using(using).filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)
+        for post, pk in zip(new, [pk for pk in pks if pk not in given]):
+            post.pk = pk
+
+
+def _render(post_body):
+    # bulk_create does not call save(), which renders.
+    post_body.render()
+    return post_body
+
+
+def iterate_posts(queryset=None, fields=POST_FIELDS, chunk_size=1000):
+    """
+    Yields ``values()`` dicts for every post in id order, reading
+    ``chunk_size`` rows per query.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    if 'id' not in fields:
+        fields = ('id',) + tuple(fields)
+    queryset = queryset.order_by('id').values(*fields)
+    last_pk = 0
+    while True:
+        count = 0
+        for row in queryset.filter(id__gt=last_pk)[:chunk_size].iterator():
+            count += 1
+            last_pk = row['id']
+            yield row
+        if count < chunk_size:
+            return
+
+
+def add_bodies_and_tags(rows, using, chunk_size=1000):
+    """
+    Adds the ``body`` and the comma separated ``tags`` of the posts to
+    ``values()`` dicts, with two queries per ``chunk_size`` rows.
+    """
+    for chunk in batched(rows, chunk_size):
+        pks = [row['id'] for row in chunk]
+        bodies = dict(PostBody.objects.using(using).filter(post__in=pks).values_list('post', 'text'))
+        names = collections.defaultdict(list)
+        for pk, name in (PostTag.objects.using(using).filter(post__in=pks).order_by('pk')
+                         .values_list('post', 'tag__name')):
+            names[pk].append(name)
+        for row in chunk:
+            row['body'] = bodies.get(row['id'], '')
+            row['tags'] = ', '.join(names[row['id']])
+            yield row
+
+
+def export_posts(stream, format='jsonl', queryset=None, chunk_size=1000, progress=None):
+    """
+    Writes every post, with its body and tags, to ``stream`` and returns
+    how many were written.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    progress = progress or Progress()
+    rows = add_bodies_and_tags(iterate_posts(queryset, chunk_size=chunk_size), queryset.db, chunk_size)
+    rows = WRITERS[format](stream, rows)
+    for batch in batched(rows, chunk_size):
+        progress.add(len(batch))
+    progress.done()
+    return progress.count
+
+
+def render_bodies(force=False, batch_size=1000, progress=None, using=None):
+    """
+    Re-renders the html of the post bodies rendered by an older
+    ``markup.RENDERER`` (of all of them with ``force``), one transaction
+    per batch, makes their pages stale and queues their pre-rendering.
+    Returns the number rendered.
+    """
+    using = using or router.db_for_write(PostBody)
+    queryset = PostBody.objects.using(using).defer('html').order_by('pk')
+    if not force:
+        queryset = queryset.exclude(renderer=markup.RENDERER)
+    progress = progress or Progress()
+    last_pk = 0
+    while True:
+        bodies = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not bodies:
+            break
+        now = timezone.now()
+        pks = [body.pk for body in bodies]
+        posts = Post.objects.using(using).filter(pk__in=pks)
+        with transaction.atomic(using=using):
+            for body in bodies:
+                body.render(force=True)
+                body.save(update_fields=['html', 'source_hash', 'renderer'])
+            # Moves the validators of the conditional GETs along.
+            posts.update(modified_date=now)
+            rows = list(posts.order_by('pk').values_list('pk', 'created_date'))
+        cache.invalidate_posts(pks, now)
+        _prerender(rows, using)
+        last_pk = pks[-1]
+        progress.add(len(bodies))
+    progress.done()
+    return progress.count
+
+
+def _batches(queryset, batch_size):
+    """
+    Yields the ``(pk, created_date)`` of the posts of ``queryset`` in
+    batches, by ascending id, so rows that stop matching (or disappear)
+    along the way are neither skipped nor visited twice.
+    """
+    queryset = queryset.order_by('pk').values_list('pk', 'created_date')
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1][0]
+
+
+def _prerender(rows, using):
+    """
+    Queues the regeneration of the pre-rendered pages of the posts
+    ``rows``, like the signals do for a single post.
+    """
+    # Both import this module.
+    from . import prerender, tasks
+    if prerender.get_root():
+        for pk, created_date in rows:
+            tasks.enqueue(tasks.regenerate_prerendered, (pk, created_date.isoformat()),
+                          key='prerender:%s' % pk, using=using)
+
+
+def _apply_in_batches(queryset, apply, batch_size, using, atomic, modified=None):
+    """
+    Calls ``apply(rows)`` for every batch of ``_batches(queryset)``, each
+    in its own transaction, or all of them in one if ``atomic``, and
+    makes the posts' pages stale and queues their pre-rendering once
+    their changes are committed.  Returns the number of posts.
+    """
+    queryset = queryset.using(using)
+    if atomic:
+        done = []
+        with transaction.atomic(using=using):
+            for rows in _batches(queryset, batch_size):
+                apply(rows)
+                done.extend(rows)
+        cache.invalidate_posts([pk for pk, created_date in done], modified)
+        _prerender(done, using)
+        return len(done)
+    count = 0
+    for rows in _batches(queryset, batch_size):
+        with transaction.atomic(using=using):
+            apply(rows)
+        cache.invalidate_posts([pk for pk, created_date in rows], modified)
+        _prerender(rows, using)
+        count += len(rows)
+    return count
+
+
+def delete_posts(queryset, batch_size=500, using=None, atomic=False):
+    """
+    Deletes the posts of ``queryset`` with one ``DELETE`` per table and
+    batch, without loading them or sending signals, and keeps the search
+    index, the archive and tag counts and the page cache in step.  With
+    ``atomic`` every batch is deleted in one transaction.  Returns the
+    number of posts deleted.
+    """
+    using = using or router.db_for_write(Post)
+
+    def delete(rows):
+        pks = [pk for pk, created_date in rows]
+        PostBody.objects.using(using).filter(post__in=pks)._raw_delete(using)
+        tagging.untag_posts(pks, using=using)
+        Post.objects.using(using).filter(pk__in=pks)._raw_delete(using)
+        search.unindex_posts(pks, using=using)
+        archive.add([created_date for pk, created_date in rows], -1, using=using)
+
+    return _apply_in_batches(queryset, delete, batch_size, using, atomic)
+
+
+def update_posts(queryset, values, batch_size=500, using=None, atomic=False):
+    """
+    Sets the field ``values`` (which may be expressions) on the posts of
+    ``queryset`` and bumps their modified_date, with one ``UPDATE`` per
+    batch and no signals, and keeps the search index, the archive counts
+    and the page cache in step.  With ``atomic`` every batch is updated
+    in one transaction.  Returns the number of posts updated.
+    """
+    using = using or router.db_for_write(Post)
+    now = timezone.now()
+
+    def update(rows):
+        pks = [pk for pk, created_date in rows]
+        Post.objects.using(using).filter(pk__in=pks).update(modified_date=now, **values)
+        if 'title' in values or 'description' in values:
+            search.reindex_posts(pks, using=using)
+        if 'created_date' in values:
+            archive.add([created_date for pk, created_date in rows], -1, using=using)
+            archive.add(Post.objects.using(using).filter(pk__in=pks)
+                        .values_list('created_date', flat=True), using=using)
+            tagging.sync_dates(pks, using=using)
+
+    return _apply_in_batches(queryset, update, batch_size, using, atomic, now)
@@ -0,0 +1,294 @@
+"""
+Versioned caching of rendered blog pages.
+
+Every cache key embeds a version number; writes never delete entries,
+they bump the version so that readers simply miss on the next request
+and old entries age out of the backend on their own.  That makes
+invalidation a single ``incr`` regardless of how many pages (cursors)
+were cached, and works on any backend (locmem, file, memcached, ...).
+
+- The list version changes whenever any post is saved or deleted.
+- Each post has its own version for its details page.
+- The archive version changes when the month counts of the sidebar do;
+  every page shows it.  So does the tags version, for the tag cloud.
+- Each sitemap shard (a fixed range of post ids) has its own version.
+
+The same signals also record when the list and each post last changed,
+which feeds the conditional GET validators in blog/conditional.py.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from . import routers
+
+LIST_VERSION_KEY = 'blog:version:list'
+POST_VERSION_KEY = 'blog:version:post:%s'
+ARCHIVE_VERSION_KEY = 'blog:version:archive'
+TAGS_VERSION_KEY = 'blog:version:tags'
+SITEMAP_VERSION_KEY = 'blog:version:sitemap:%s'
+SITEMAP_MODIFIED_KEY = 'blog:modified:sitemap:%s'
+LIST_MODIFIED_KEY = 'blog:modified:list'
+POST_MODIFIED_KEY = 'blog:modified:post:%s'
+HITS_KEY = 'blog:stats:hits'
+MISSES_KEY = 'blog:stats:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'BLOG_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'BLOG_CACHE_TIMEOUT', 60 * 60)
+
+
+def _initial_version():
+    # Versions start from the clock rather than 1, so that an evicted
+    # version key can never come back pointing at entries it used to own.
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def list_version():
+    return get_version(LIST_VERSION_KEY)
+
+
+def post_version(pk):
+    return get_version(POST_VERSION_KEY % pk)
+
+
+def archive_version():
+    return get_version(ARCHIVE_VERSION_KEY)
+
+
+def tags_version():
+    return get_version(TAGS_VERSION_KEY)
+
+
+def sidebar_version():
+    # Every page shows the archive months and the tag cloud.
+    return '%s-%s' % (archive_version(), tags_version())
+
+
+def sitemap_version(shard):
+    return get_version(SITEMAP_VERSION_KEY % shard)
+
+
+def sitemap_shard_size():
+    return getattr(settings, 'BLOG_SITEMAP_SHARD_SIZE', 50000)
+
+
+def sitemap_shard(pk):
+    """
+    Returns the sitemap shard listing post ``pk``, see blog/sitemaps.py.
+    """
+    return (int(pk) - 1) // sitemap_shard_size()
+
+
+def invalidate_post(pk, modified=None):
+    """
+    Makes the list pages, the details page and the sitemap shard of post
+    ``pk`` stale.  ``modified`` is the post's new modified_date, or None
+    if it was deleted.
+    """
+    cache = get_cache()
+    invalidate_list(modified)
+    bump_version(POST_VERSION_KEY % pk)
+    invalidate_sitemap([sitemap_shard(pk)], modified)
+    if modified is None:
+        cache.delete(POST_MODIFIED_KEY % pk)
+    else:
+        cache.set(POST_MODIFIED_KEY % pk, modified, None)
+
+
+def invalidate_posts(pks, modified=None, batch_size=1000):
+    """
+    ``invalidate_post`` for many posts, e.g. after a bulk update, with a
+    few round trips per ``batch_size`` posts instead of three per post.
+    """
+    cache = get_cache()
+    invalidate_list(modified)
+    pks = list(pks)
+    invalidate_sitemap(set(sitemap_shard(pk) for pk in pks), modified)
+    for start in range(0, len(pks), batch_size):
+        version_keys = [POST_VERSION_KEY % pk for pk in pks[start:start + batch_size]]
+        modified_keys = [POST_MODIFIED_KEY % pk for pk in pks[start:start + batch_size]]
+        # Set rather than incr: no batched incr, but never back to an old value.
+        versions = cache.get_many(version_keys)
+        initial = _initial_version()
+        cache.set_many(dict((key, max(versions.get(key, 0) + 1, initial)) for key in version_keys),
+                       None)
+        if modified is None:
+            cache.delete_many(modified_keys)
+        else:
+            cache.set_many(dict((key, modified) for key in modified_keys), None)
+
+
+def invalidate_list(modified=None):
+    """
+    Makes the list pages stale, e.g. after posts were added in bulk.
+    """
+    bump_version(LIST_VERSION_KEY)
+    get_cache().set(LIST_MODIFIED_KEY, modified or timezone.now(), None)
+
+
+def invalidate_archive():
+    """
+    Makes the archive months stale, along with every page showing them.
+    """
+    bump_version(ARCHIVE_VERSION_KEY)
+
+
+def invalidate_sitemap(shards, modified=None):
+    """
+    Makes the sitemap ``shards`` stale and records when they changed.
+    """
+    modified = modified or timezone.now()
+    for shard in sorted(shards):
+        bump_version(SITEMAP_VERSION_KEY % shard)
+    get_cache().set_many(dict((SITEMAP_MODIFIED_KEY % shard, modified) for shard in shards), None)
+
+
+def invalidate_tags():
+    """
+    Makes the tag cloud stale, along with every page showing it.
+    """
+    bump_version(TAGS_VERSION_KEY)
+
+
+def list_last_modified():
+    """
+    Returns when any post was last saved or deleted.  Deletes leave no
+    trace in the database, so if the value was evicted it restarts from
+    now: a client holding an older copy gets a full response once.
+    """
+    cache = get_cache()
+    modified = cache.get(LIST_MODIFIED_KEY)
+    if modified is None:
+        cache.add(LIST_MODIFIED_KEY, timezone.now(), None)
+        modified = cache.get(LIST_MODIFIED_KEY)
+    return modified
+
+
+def post_last_modified(pk):
+    return get_cache().get(POST_MODIFIED_KEY % pk)
+
+
+def set_post_last_modified(pk, modified):
+    get_cache().set(POST_MODIFIED_KEY % pk, modified, None)
+
+
+def sitemap_last_modified(shards):
+    """
+    Returns a dict of when each of the sitemap ``shards`` last changed,
+    as far as the cache knows.
+    """
+    values = get_cache().get_many([SITEMAP_MODIFIED_KEY % shard for shard in shards])
+    return dict((shard, values[SITEMAP_MODIFIED_KEY % shard]) for shard in shards
+                if SITEMAP_MODIFIED_KEY % shard in values)
+
+
+def set_sitemap_last_modified(shard, modified):
+    if can_store():
+            get_cache().add(SITEMAP_MODIFIED_KEY % shard, modified, None)
+
+
+def list_page_key(cursor=None):
+    return 'blog:page:list:%s:%s:%s' % (list_version(), sidebar_version(), cursor or '')
+
+
+def archive_page_key(year, month=None, cursor=None):
+    return 'blog:page:archive:%s:%s:%s:%s:%s' % (list_version(), sidebar_version(), year, month or '',
+                                                 cursor or '')
+
+
+def tag_page_key(slug, cursor=None):
+    return 'blog:page:tag:%s:%s:%s:%s' % (list_version(), sidebar_version(), slug, cursor or '')
+
+
+def sitemap_index_key(host):
+    # Sitemaps contain absolute links, so they differ per host.
+    return 'blog:sitemap:index:%s:%s' % (host, list_version())
+
+
+def sitemap_shard_key(host, shard):
+    return 'blog:sitemap:%s:%s:%s' % (host, shard, sitemap_version(shard))
+
+
+def archive_months_key():
+    return 'blog:archive:months:%s' % archive_version()
+
+
+def tag_cloud_key():
+    return 'blog:tags:cloud:%s' % tags_version()
+
+
+def post_page_key(pk):
+    return 'blog:page:post:%s:%s:%s' % (pk, post_version(pk), sidebar_version())
+
+
+def feed_key(name, host):
+    # Feeds contain absolute links, so they differ per host.
+    return 'blog:feed:%s:%s:%s' % (name, host, list_version())
+
+
+def get_page(key):
+    content = get_cache().get(key)
+    _count(HITS_KEY if content is not None else MISSES_KEY)
+    return content
+
+
+def can_store():
+    """
+    Whether what this thread rendered may be cached: not when it read
+    from a replica, which may lag behind the versions in the keys.
+    """
+    return routers.reads_primary()
+
+
+def set_page(key, content, timeout=-1):
+    if can_store():
+        get_cache().set(key, content, get_timeout() if timeout == -1 else timeout)
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def stats():
+    cache = get_cache()
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = values.get(HITS_KEY, 0), values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': float(hits) / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
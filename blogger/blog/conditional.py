@@ -0,0 +1,58 @@
+"""
+Validators for conditional GET (``ETag`` / ``Last-Modified`` / 304).
+
+They are meant for ``django.views.decorators.http.condition`` and run
+before the view, so a matching request never renders a template.  Values
+come from the cache maintained by the post signals (blog/cache.py); the
+details validators fall back to a single-column primary key lookup.
+
+Every page shows the archive sidebar and the tag cloud, which change with
+other posts, so their versions are part of every ETag, and the details
+pages are only as old as the last change of any post.
+"""
+import calendar
+
+from . import cache
+from .models import Post
+
+
+def _timestamp(value):
+    return '%d%06d' % (calendar.timegm(value.utctimetuple()), value.microsecond)
+
+
+def _post_modified(pk):
+    modified = cache.post_last_modified(pk)
+    if modified is None:
+        modified = Post.objects.filter(pk=pk).values_list(
+            'modified_date', flat=True).first()
+        if modified is not None:
+            cache.set_post_last_modified(pk, modified)
+    return modified
+
+
+def post_last_modified(request, pk, **kwargs):
+    modified = _post_modified(pk)
+    if modified is None:
+        return None
+    return max(modified, cache.list_last_modified())
+
+
+def post_etag(request, pk, **kwargs):
+    modified = _post_modified(pk)
+    if modified is None:
+        return None
+    return 'post-%s-%s-%s' % (pk, _timestamp(modified), cache.sidebar_version())
+
+
+def list_last_modified(request, *args, **kwargs):
+    return cache.list_last_modified()
+
+
+def feed_etag(request, *args, **kwargs):
+    return 'feed-%s-%s' % (request.path, _timestamp(list_last_modified(request)))
+
+
+def list_etag(request, *args, **kwargs):
+    # Each cursor is a different representation of the list.
+    return 'list-%s-%s-%s' % (_timestamp(list_last_modified(request)), cache.sidebar_version(),
+                              request.GET.get('cursor', ''))
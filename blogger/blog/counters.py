@@ -0,0 +1,135 @@
+"""
+Buffered per-post view counters.
+
+An ``UPDATE`` per page view would serialize readers on SQLite's write
+lock, so views are counted in an in-process buffer instead.  A
+background thread per worker writes the buffer every
+``BLOG_VIEW_FLUSH_INTERVAL`` seconds, or as soon as it holds
+``BLOG_VIEW_FLUSH_SIZE`` views, in one transaction of ``F()`` increments
+(one ``UPDATE`` per distinct count).  Counts are approximate: a crashed
+worker loses at most one interval of views, and a clean exit flushes.
+"""
+import atexit
+import collections
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+
+from .bulk import batched
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Primary keys per UPDATE, below SQLite's 999 variables limit.
+UPDATE_BATCH_SIZE = 500
+
+
+class ViewCounter(object):
+    def __init__(self, interval=10, size=1000):
+        self.interval = interval
+        self.size = size
+        self.lock = threading.Lock()
+        self.pending = collections.Counter()
+        self.total = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+    def add(self, pk, count=1):
+        with self.lock:
+            self.pending[int(pk)] += count
+            self.total += count
+            full = self.total >= self.size
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def take(self):
+        """
+        Returns the buffered counts by post id and empties the buffer.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, collections.Counter()
+            self.total = 0
+        return pending
+
+    def clear(self):
+        self.take()
+
+    def flush(self):
+        """
+        Writes the buffered counts and returns the number of views written.
+        If writing fails they are put back for the next flush.
+        """
+        counts = self.take()
+        if not counts:
+            return 0
+        pks_by_count = collections.defaultdict(list)
+        for pk, count in counts.items():
+            pks_by_count[count].append(pk)
+        try:
+            with transaction.atomic(using=router.db_for_write(Post)):
+                for count, pks in pks_by_count.items():
+                    for batch in batched(sorted(pks), UPDATE_BATCH_SIZE):
+                        Post.objects.filter(pk__in=batch).update(view_count=F('view_count') + count)
+        except Exception:
+            with self.lock:
+                self.pending.update(counts)
+                self.total += sum(counts.values())
+            raise
+        return sum(counts.values())
+
+    def _ensure_thread(self):
+        # Also restarts the thread in a forked worker, which doesn't inherit it.
+        if self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, name='blog-view-counter')
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """
+        Stops the flushing thread, e.g. before the interpreter shuts down.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(self.interval)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopping:
+                return
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing view counts failed.")
+            finally:
+                # The thread's own connections, unused until the next flush.
+                connections.close_all()
+
+
+view_counter = ViewCounter(
+    interval=getattr(settings, 'BLOG_VIEW_FLUSH_INTERVAL', 10),
+    size=getattr(settings, 'BLOG_VIEW_FLUSH_SIZE', 1000),
+)
+
+
+@atexit.register
+def _flush_at_exit():
+    view_counter.stop()
+    try:
+        view_counter.flush()
+    except Exception:
+        logger.exception("Flushing view counts at exit failed.")
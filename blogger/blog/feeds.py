@@ -0,0 +1,60 @@
+"""
+RSS and Atom feeds of the latest posts.
+
+Feed readers poll constantly, so the serialized feed is cached per host
+under the list version (see blog/cache.py) and only regenerated after a
+post was created, updated or deleted.  Polls carrying the current
+validators are answered with a 304 before the cache is even read.
+"""
+from django.contrib.syndication.views import Feed
+from django.core.urlresolvers import reverse, reverse_lazy
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.utils.feedgenerator import Atom1Feed
+from django.views.decorators.http import condition
+
+from . import cache, conditional
+from .models import Post
+
+
+class LatestPostsFeed(Feed):
+    title = "Tivix Blogger"
+    link = reverse_lazy('blog:list')
+    description = "The latest posts on Tivix Blogger."
+    feed_name = 'rss'
+    size = 20
+
+    @method_decorator(condition(etag_func=conditional.feed_etag,
+                                last_modified_func=conditional.list_last_modified))
+    def __call__(self, request, *args, **kwargs):
+        key = cache.feed_key(self.feed_name, request.get_host())
+        cached = cache.get_page(key)
+        if cached is None:
+            response = super(LatestPostsFeed, self).__call__(request, *args, **kwargs)
+            cached = (response.content, response['Content-Type'])
+            cache.set_page(key, cached)
+        content, content_type = cached
+        # Last-Modified is left to the condition decorator, so that it
+        # agrees with the ETag (the feed's own ignores deleted posts).
+        return HttpResponse(content, content_type=content_type)
+
+    def items(self):
+        return Post.objects.order_by('-created_date', '-id')[:self.size]
+
+    def item_description(self, item):
+        return item.description
+
+    def item_link(self, item):
+        return reverse('blog:details', args=(item.pk,))
+
+    def item_pubdate(self, item):
+        return item.created_date
+
+    def item_updateddate(self, item):
+        return item.modified_date
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    feed_name = 'atom'
+    subtitle = LatestPostsFeed.description
@@ -0,0 +1,38 @@
+import zlib
+
+from django.db import models
+from django.utils.encoding import force_bytes, force_text
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Text stored zlib-compressed in a binary column.  Python code only ever
+    sees unicode text; the column can't be filtered on.
+    """
+    def __init__(self, *args, **kwargs):
+        self.level = kwargs.pop('level', 6)
+        super(CompressedTextField, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(CompressedTextField, self).deconstruct()
+        if self.level != 6:
+            kwargs['level'] = self.level
+        return name, path, args, kwargs
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is not None:
+            value = zlib.compress(force_bytes(value), self.level)
+        return super(CompressedTextField, self).get_db_prep_value(value, connection, prepared)
+
+    def from_db_value(self, value, expression, connection, context):
+        if value is None:
+            return value
+        return force_text(zlib.decompress(bytes(value)))
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def to_python(self, value):
+        if value is None:
+            return value
+        return force_text(value)
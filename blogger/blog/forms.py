@@ -1,13 +1,90 @@
 from django import forms
 from django.forms import ModelForm, Textarea
 
+from . import tagging
 from .models import Post
 
 class PostForm(ModelForm):
+    # Lives in PostBody, see Post.body.
+    body = forms.CharField(required=False, widget=Textarea(attrs={'cols': 80, 'rows': 40}))
+    # Comma separated, set through blog.tagging.
+    tags = forms.CharField(required=False, max_length=500)
+
     class Meta:
         model = Post
         fields = ["title", "description"] 
         widgets = {
             'title': Textarea(attrs={'cols': 80, 'rows': 20}),
             'description': Textarea(attrs={'cols': 80, 'rows': 20}),
-        }
\ No newline at end of file
+        }
+
+    def __init__(self, *args, **kwargs):
+        super(PostForm, self).__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['body'].initial = self.instance.body
+            self.fields['tags'].initial = ', '.join(tag.name for tag in self.instance.tags.all())
+
+    def save(self, commit=True):
+        self.instance.body = self.cleaned_data['body']
+        return super(PostForm, self).save(commit)
+
+    def _save_m2m(self):
+        super(PostForm, self)._save_m2m()
+        tagging.set_tags(self.instance, tagging.parse_tags(self.cleaned_data['tags']))
+
+
+class PostSelectionForm(forms.Form):
+    """
+    Selects posts for a bulk change, by ids and/or a created_date range.
+    """
+    ids = forms.CharField(required=False, help_text="Comma separated post ids.")
+    created_after = forms.DateTimeField(required=False)
+    created_before = forms.DateTimeField(required=False)
+
+    def clean_ids(self):
+        try:
+            return [int(pk) for pk in self.cleaned_data['ids'].split(',') if pk.strip()]
+        except ValueError:
+            raise forms.ValidationError("Enter comma separated post ids.")
+
+    def clean(self):
+        cleaned_data = super(PostSelectionForm, self).clean()
+        if not any(cleaned_data.get(name) for name in ('ids', 'created_after', 'created_before')):
+            raise forms.ValidationError("Select posts by ids or created date.")
+        return cleaned_data
+
+    def get_queryset(self):
+        queryset = Post.objects.all()
+        if self.cleaned_data['ids']:
+            queryset = queryset.filter(pk__in=self.cleaned_data['ids'])
+        if self.cleaned_data['created_after']:
+            queryset = queryset.filter(created_date__gte=self.cleaned_data['created_after'])
+        if self.cleaned_data['created_before']:
+            queryset = queryset.filter(created_date__lt=self.cleaned_data['created_before'])
+        return queryset
+
+
+class PostBulkUpdateForm(PostSelectionForm):
+    """
+    The fields to set on the selected posts; those left out of the data
+    are left unchanged.
+    """
+    update_fields = ('title', 'description', 'created_date')
+
+    title = forms.CharField(required=False, max_length=Post._meta.get_field('title').max_length)
+    description = forms.CharField(required=False,
+                                  max_length=Post._meta.get_field('description').max_length)
+    created_date = forms.DateTimeField(required=False)
+
+    def clean(self):
+        cleaned_data = super(PostBulkUpdateForm, self).clean()
+        if not self.get_values():
+            raise forms.ValidationError("Set at least one of: %s." % ', '.join(self.update_fields))
+        for name, value in self.get_values().items():
+            if value in (None, '') and not Post._meta.get_field(name).blank:
+                self.add_error(name, "This field cannot be empty.")
+        return cleaned_data
+
+    def get_values(self):
+        return dict((name, self.cleaned_data.get(name)) for name in self.update_fields
+                    if name in self.data and name in self.cleaned_data)
@@ -0,0 +1,74 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from blog import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Seeds a throwaway test database with posts and measures latency, "
+            "throughput and queries per request of every blog view.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000,
+                            help="Posts to seed, e.g. 1000, 100000 or 1000000.")
+        parser.add_argument('--requests', type=int, default=100,
+                            help="Requests sent per view.")
+        parser.add_argument('--views', default=None,
+                            help="Comma separated scenarios to run, all by default.")
+        parser.add_argument('--cold', action='store_true',
+                            help="Clear the cache before every request.")
+        parser.add_argument('--output', default=None,
+                            help="Write the results as JSON to this file.")
+        parser.add_argument('--baseline', default=None,
+                            help="JSON results to compare against; regressions fail the run.")
+        parser.add_argument('--latency-threshold', type=float, default=0.2,
+                            help="Allowed p95 slowdown against the baseline, as a fraction.")
+        parser.add_argument('--query-threshold', type=float, default=0.0,
+                            help="Allowed extra queries per request against the baseline.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['results']
+        views = options['views'].split(',') if options['views'] else None
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            self.stdout.write("Seeding %d posts..." % options['posts'])
+            benchmark.seed_posts(options['posts'])
+            results = benchmark.run(options['requests'], views, options['cold'])
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        self.stdout.write("%-12s %9s %9s %9s %10s %8s %7s" % (
+            'view', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries', 'errors'))
+        for name, stats in sorted(results.items()):
+            self.stdout.write("%-12s %9.2f %9.2f %9.2f %10.1f %8.2f %7d" % (
+                name, stats['p50'], stats['p95'], stats['p99'],
+                stats['throughput'], stats['queries'], stats['errors']))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'posts': options['posts'], 'requests': options['requests'],
+                           'cold': options['cold'], 'results': results},
+                          f, indent=2, sort_keys=True)
+
+        failed = ["%s: %d of %d requests failed" % (name, stats['errors'], stats['requests'])
+                  for name, stats in sorted(results.items()) if stats['errors']]
+        if failed:
+            raise CommandError("Error responses:\n%s" % '\n'.join(failed))
+
+        if baseline is not None:
+            regressions = benchmark.compare(results, baseline, options['latency_threshold'],
+                                            options['query_threshold'])
+            if regressions:
+                raise CommandError("Regressions against %s:\n%s" % (
+                    options['baseline'], '\n'.join(regressions)))
+            self.stdout.write("No regressions against %s." % options['baseline'])
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import bulk
+from blog.forms import PostSelectionForm
+
+
+class Command(BaseCommand):
+    help = ("Deletes the posts selected by ids and/or created date in one transaction "
+            "of batched set-based queries.")
+    form_class = PostSelectionForm
+    verb = "Deleted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', default='',
+                            help="Comma separated ids of the posts.")
+        parser.add_argument('--created-after', default='',
+                            help="Only posts created at or after this datetime.")
+        parser.add_argument('--created-before', default='',
+                            help="Only posts created before this datetime.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Posts changed per query.")
+        parser.add_argument('--database', default=None,
+                            help="Database alias to change the posts on.")
+
+    def handle(self, *args, **options):
+        form = self.form_class(self.get_data(options))
+        if not form.is_valid():
+            raise CommandError(' '.join('%s%s' % ('' if field == '__all__' else '%s: ' % field, error)
+                                        for field, errors in sorted(form.errors.items())
+                                        for error in errors))
+        queryset = form.get_queryset()
+        if options['database']:
+            queryset = queryset.using(options['database'])
+        start = time.time()
+        count = self.apply(form, queryset, options['batch_size'], options['database'])
+        self.stdout.write("%s %d posts in %.2fs." % (self.verb, count, time.time() - start))
+
+    def get_data(self, options):
+        return {
+            'ids': options['ids'],
+            'created_after': options['created_after'],
+            'created_before': options['created_before'],
+        }
+
+    def apply(self, form, queryset, batch_size, using):
+        return bulk.delete_posts(queryset, batch_size, using, atomic=True)
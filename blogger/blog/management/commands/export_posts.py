@@ -0,0 +1,49 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand
+from django.utils import six
+
+from blog import bulk
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Streams every post to a JSONL or CSV file in id order."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to write, or - for standard output.")
+        parser.add_argument('--format', choices=bulk.FORMATS, default=None,
+                            help="Output format, guessed from the file name by default.")
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Posts read per query.")
+        parser.add_argument('--database', default=None,
+                            help="Database alias to export from.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or bulk.guess_format(path)
+        # Progress goes to stderr when the posts themselves go to stdout.
+        self.progress_stream = self.stderr if path == '-' else self.stdout
+        progress = bulk.Progress(self.report if options['verbosity'] else None,
+                                 every=max(options['chunk_size'], 10000))
+        queryset = Post.objects.all()
+        if options['database']:
+            queryset = queryset.using(options['database'])
+        stream = self.open(path, format)
+        try:
+            bulk.export_posts(stream, format, queryset, options['chunk_size'], progress)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+    def open(self, path, format):
+        if path == '-':
+            return sys.stdout
+        # Python 2's csv module only writes byte strings.
+        if format == 'csv' and six.PY2:
+            return open(path, 'wb')
+        return io.open(path, 'w', encoding='utf-8', newline='' if format == 'csv' else None)
+
+    def report(self, progress):
+        self.progress_stream.write("Exported %d posts (%d posts/s)." % (progress.count, progress.rate))
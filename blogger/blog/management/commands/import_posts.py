@@ -0,0 +1,47 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import six
+
+from blog import bulk
+
+
+class Command(BaseCommand):
+    help = "Streams posts from a JSONL or CSV file into the database in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or - for standard input.")
+        parser.add_argument('--format', choices=bulk.FORMATS, default=None,
+                            help="Input format, guessed from the file name by default.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Posts inserted per bulk_create and transaction.")
+        parser.add_argument('--database', default=None,
+                            help="Database alias to import into.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or bulk.guess_format(path)
+        progress = bulk.Progress(self.report if options['verbosity'] else None,
+                                 every=max(options['batch_size'], 10000))
+        stream = self.open(path, format)
+        try:
+            rows = bulk.READERS[format](stream)
+            bulk.import_posts(rows, options['batch_size'], progress, options['database'])
+        except ValueError as e:
+            # Invalid rows as well as malformed JSON or CSV.
+            raise CommandError("%s (%d posts imported before the error)" % (e, progress.count))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def open(self, path, format):
+        if path == '-':
+            return sys.stdin
+        # Python 2's csv module only reads byte strings.
+        if format == 'csv' and six.PY2:
+            return open(path, 'rb')
+        return io.open(path, encoding='utf-8', newline='' if format == 'csv' else None)
+
+    def report(self, progress):
+        self.stdout.write("Imported %d posts (%d posts/s)." % (progress.count, progress.rate))
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.warmup import templates_cached
+
+# Run in a fresh interpreter: imports the WSGI application like a new
+# worker would and times it and its first two responses.
+CHILD = """
+import json, sys, time
+start = time.time()
+from django.conf import settings
+settings.BLOG_WARMUP = %(warmup)r
+import blogger.wsgi
+from wsgiref.util import setup_testing_defaults
+imported = time.time()
+
+def request():
+    environ = {'PATH_INFO': %(path)r, 'HTTP_HOST': %(host)r}
+    setup_testing_defaults(environ)
+    status = []
+    response = blogger.wsgi.application(environ, lambda s, h, e=None: status.append(s))
+    try:
+        for chunk in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(status[0].split()[0])
+
+status = request()
+first = time.time()
+request()
+second = time.time()
+json.dump({'import': imported - start, 'first': first - imported,
+           'second': second - first, 'status': status}, sys.stdout)
+"""
+
+
+class Command(BaseCommand):
+    help = ("Measures the cold start of a worker: importing the WSGI application "
+            "and serving its first response, in fresh processes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/blog/',
+                            help="Path requested.")
+        parser.add_argument('--runs', type=int, default=3,
+                            help="Fresh processes measured; the median is reported.")
+        parser.add_argument('--compare', action='store_true', default=False,
+                            help="Also measure with BLOG_WARMUP off.")
+
+    def measure(self, warmup, path, host):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'blogger.settings'))
+        process = subprocess.Popen(
+            [sys.executable, '-c', CHILD % {'warmup': warmup, 'path': path, 'host': host}],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = process.communicate()
+        if process.returncode:
+            raise CommandError("The worker failed to start:\n%s" % err.decode('utf-8', 'replace'))
+        return json.loads(out.decode('utf-8'))
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs must be at least 1.")
+        hosts = [host for host in settings.ALLOWED_HOSTS if '*' not in host]
+        host = hosts[0].lstrip('.') if hosts else 'localhost'
+        modes = [True, False] if options['compare'] else [bool(getattr(settings, 'BLOG_WARMUP', True))]
+        if not templates_cached():
+            self.stderr.write("Templates are not cached (BLOG_CACHED_TEMPLATES is off): the warm-up "
+                              "does not compile them and every request does.")
+
+        self.stdout.write("%-8s %10s %10s %10s %10s %7s" % (
+            'warm-up', 'import ms', 'first ms', 'second ms', 'total ms', 'status'))
+        for warmup in modes:
+            runs = [self.measure(warmup, options['path'], host) for i in range(options['runs'])]
+            median = dict((key, sorted(run[key] for run in runs)[len(runs) // 2])
+                          for key in ('import', 'first', 'second'))
+            self.stdout.write("%-8s %10.2f %10.2f %10.2f %10.2f %7d" % (
+                'on' if warmup else 'off', median['import'] * 1000, median['first'] * 1000,
+                median['second'] * 1000, (median['import'] + median['first']) * 1000,
+                runs[-1]['status']))
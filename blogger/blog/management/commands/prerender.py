@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import prerender
+
+
+class Command(BaseCommand):
+    help = "Renders the post list and details pages to static files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help="Directory to write to, BLOG_PRERENDER_ROOT by default.")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Rendering processes.")
+
+    def handle(self, *args, **options):
+        root = options['output'] or prerender.get_root()
+        if not root:
+            raise CommandError("Pass --output or set BLOG_PRERENDER_ROOT.")
+        start = time.time()
+        count = prerender.build(root, workers=options['workers'])
+        self.stdout.write("Pre-rendered %d pages to %s in %.2fs." % (count, root, time.time() - start))
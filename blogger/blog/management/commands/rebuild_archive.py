@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import archive
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recounts the posts per month of the archive from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None,
+                            help="Database alias to rebuild the archive on.")
+
+    def handle(self, *args, **options):
+        start = time.time()
+        queryset = Post.objects.all()
+        if options['database']:
+            queryset = queryset.using(options['database'])
+        count = archive.rebuild(queryset)
+        self.stdout.write("Counted posts of %d months in %.2fs." % (count, time.time() - start))
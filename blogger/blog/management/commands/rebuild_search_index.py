@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import search
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index of all posts in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None,
+                            help="Database alias to rebuild the index on.")
+
+    def handle(self, *args, **options):
+        start = time.time()
+        count = search.rebuild(using=options['database'])
+        self.stdout.write("Indexed %d posts in %.2fs." % (count, time.time() - start))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import tagging
+
+
+class Command(BaseCommand):
+    help = "Recounts the posts of every tag from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None,
+                            help="Database alias to recount the tags on.")
+
+    def handle(self, *args, **options):
+        start = time.time()
+        count = tagging.rebuild(options['database'])
+        self.stdout.write("Counted posts of %d tags in %.2fs." % (count, time.time() - start))
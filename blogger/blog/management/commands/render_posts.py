@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import bulk, markup
+
+
+class Command(BaseCommand):
+    help = ("Re-renders the stored HTML of post bodies made by an older renderer, "
+            "e.g. after blog.markup.VERSION or the markdown package changed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', dest='force', default=False,
+                            help="Re-render every body, not just outdated ones.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Bodies rendered per transaction.")
+        parser.add_argument('--database', default=None,
+                            help="Database alias to render on.")
+
+    def handle(self, *args, **options):
+        start = time.time()
+        progress = bulk.Progress(self.report if options['verbosity'] > 1 else None,
+                                 every=max(options['batch_size'], 10000))
+        count = bulk.render_bodies(options['force'], options['batch_size'], progress,
+                                   options['database'])
+        self.stdout.write("Rendered %d post bodies with %s in %.2fs." % (
+            count, markup.RENDERER, time.time() - start))
+
+    def report(self, progress):
+        self.stdout.write("Rendered %d post bodies (%d bodies/s)." % (progress.count, progress.rate))
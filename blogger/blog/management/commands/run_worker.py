@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from blog import tasks
+
+
+class Command(BaseCommand):
+    help = "Runs the background tasks queued in the database (BLOG_TASK_BACKEND = DatabaseBackend)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', default=False,
+                            help="Exit once the queue is empty instead of waiting for tasks.")
+        parser.add_argument('--batch-size', type=int, default=10,
+                            help="Tasks claimed at a time.")
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--database', default=None,
+                            help="Database alias of the queue.")
+
+    def handle(self, *args, **options):
+        backend = tasks.get_backend()
+        if not isinstance(backend, tasks.DatabaseBackend):
+            raise CommandError("BLOG_TASK_BACKEND is not a DatabaseBackend, tasks are not queued "
+                               "in the database.")
+        total = 0
+        try:
+            while True:
+                count = backend.run_pending(batch_size=options['batch_size'], using=options['database'])
+                total += count
+                if count and options['verbosity'] > 1:
+                    self.stdout.write("Ran %d tasks." % count)
+                if options['once']:
+                    break
+                # Idle connections would hold the SQLite WAL open.
+                connections.close_all()
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Ran %d tasks." % total)
@@ -0,0 +1,32 @@
+from django.core.management.base import CommandError
+
+from blog import bulk
+from blog.forms import PostBulkUpdateForm
+
+from .delete_posts import Command as DeletePostsCommand
+
+
+class Command(DeletePostsCommand):
+    help = ("Sets fields of the posts selected by ids and/or created date in one "
+            "transaction of batched set-based queries.")
+    form_class = PostBulkUpdateForm
+    verb = "Updated"
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--set', action='append', default=[], dest='values', metavar='FIELD=VALUE',
+                            help="A field to set, one of: %s. Repeat for more fields." %
+                                 ', '.join(PostBulkUpdateForm.update_fields))
+
+    def get_data(self, options):
+        data = super(Command, self).get_data(options)
+        for value in options['values']:
+            name, equals, value = value.partition('=')
+            if not equals or name not in PostBulkUpdateForm.update_fields:
+                raise CommandError("Expected FIELD=VALUE with FIELD one of: %s." %
+                                   ', '.join(PostBulkUpdateForm.update_fields))
+            data[name] = value
+        return data
+
+    def apply(self, form, queryset, batch_size, using):
+        return bulk.update_posts(queryset, form.get_values(), batch_size, using, atomic=True)
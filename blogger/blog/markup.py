@@ -0,0 +1,108 @@
+"""
+Markdown rendering of post bodies.
+
+Bodies are rendered once, when saved, and the HTML is stored next to the
+source in PostBody with the source's hash and the ``RENDERER`` that made
+it, so views only output stored HTML.  Raw HTML in the source is escaped
+and links are restricted to safe schemes, which makes the output safe to
+mark as such.  Without the optional ``markdown`` package bodies fall
+back to escaped paragraphs.
+
+Bump ``VERSION`` whenever the output for the same source changes, then
+run the ``render_posts`` management command.
+"""
+import hashlib
+import re
+
+from django.utils import six
+from django.utils.encoding import force_bytes
+from django.utils.html import escape, linebreaks
+from django.utils.six.moves import html_entities
+
+try:
+    import markdown
+except ImportError:
+    markdown = None
+
+VERSION = 2
+
+if markdown is not None:
+    RENDERER = 'markdown-%s/%d' % (markdown.__version__, VERSION)
+else:
+    RENDERER = 'plain/%d' % VERSION
+
+SAFE_SCHEMES = ('http', 'https', 'mailto', 'ftp')
+
+EXTENSIONS = ['markdown.extensions.fenced_code', 'markdown.extensions.tables']
+
+
+def content_hash(source):
+    return hashlib.sha1(force_bytes(source)).hexdigest()
+
+
+# Character references as browsers read them in attributes, the final
+# semicolon being optional, and the HTML5 names that hide a scheme.
+CHARREF = re.compile(r'&(?:#[xX]([0-9a-fA-F]+)|#([0-9]+)|([a-zA-Z][a-zA-Z0-9]*));?')
+
+ENTITIES = dict(html_entities.name2codepoint, colon=ord(':'), Tab=ord('\t'), NewLine=ord('\n'))
+
+# Browsers skip whitespace and control characters in a scheme.
+IGNORED = re.compile(r'[\x00-\x20\x7f-\x9f]+')
+
+
+def _charref(match):
+    hex_code, code, name = match.groups()
+    if name is not None:
+        if name not in ENTITIES:
+            return match.group(0)
+        code = ENTITIES[name]
+    else:
+        code = int(hex_code, 16) if hex_code is not None else int(code)
+    try:
+        return six.unichr(code)
+    except (ValueError, OverflowError):
+        return u'\ufffd'
+
+
+def is_safe_url(url):
+    """
+    Whether ``url`` is relative or has one of the ``SAFE_SCHEMES``, read
+    the way a browser would: character references decoded, whitespace
+    and control characters dropped.
+    """
+    url = IGNORED.sub('', CHARREF.sub(_charref, url))
+    scheme, colon, rest = url.partition(':')
+    return not colon or scheme.lower() in SAFE_SCHEMES
+
+
+if markdown is not None:
+    class SafeLinks(markdown.treeprocessors.Treeprocessor):
+        def run(self, root):
+            for element in root.iter():
+                for attribute in ('href', 'src'):
+                    if attribute in element.attrib and not is_safe_url(element.attrib[attribute]):
+                        del element.attrib[attribute]
+
+    class SafeExtension(markdown.extensions.Extension):
+        def extendMarkdown(self, md, *args):
+            # Raw HTML blocks and inline tags are left as (escaped) text.
+            if hasattr(md.preprocessors, 'deregister'):
+                md.preprocessors.deregister('html_block')
+                md.inlinePatterns.deregister('html')
+                md.treeprocessors.register(SafeLinks(md), 'safe_links', 0)
+            else:
+                # Markdown 2.x keeps them in OrderedDicts.
+                del md.preprocessors['html_block']
+                del md.inlinePatterns['html']
+                md.treeprocessors.add('safe_links', SafeLinks(md), '_end')
+
+
+def render(source):
+    """
+    Returns the sanitized HTML of the Markdown ``source``.
+    """
+    if not source:
+        return ''
+    if markdown is None:
+        return linebreaks(escape(source))
+    return markdown.markdown(source, extensions=EXTENSIONS + [SafeExtension()])
@@ -0,0 +1,132 @@
+"""
+In-process request metrics.
+
+Every worker keeps a rolling window of the latest samples per url name
+and a short log of slow queries, both in bounded ring buffers, so memory
+stays constant however long the worker lives.  The numbers are per
+worker process; they are meant for spotting hot endpoints, not billing.
+"""
+import collections
+import math
+import threading
+
+from django.conf import settings
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    if not values:
+        return 0.0
+    rank = int(math.ceil(fraction * len(values)))
+    return values[max(0, min(len(values), rank) - 1)]
+
+
+Sample = collections.namedtuple('Sample', 'total db_time db_queries template_time')
+
+SlowQuery = collections.namedtuple('SlowQuery', 'duration sql url_name')
+
+
+class RequestStats(object):
+    def __init__(self, window=1000, slow_query_log=100):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.counts = collections.Counter()
+        self.slow_queries = collections.deque(maxlen=slow_query_log)
+
+    def record(self, url_name, sample, slow_queries=()):
+        with self.lock:
+            samples = self.samples.get(url_name)
+            if samples is None:
+                samples = self.samples[url_name] = collections.deque(maxlen=self.window)
+            samples.append(sample)
+            self.counts[url_name] += 1
+            for duration, sql in slow_queries:
+                self.slow_queries.append(SlowQuery(duration, sql, url_name))
+
+    def endpoints(self):
+        """
+        Returns per url name stats over the window, hottest (most time
+        spent in total) first.  Times are in milliseconds.
+        """
+        with self.lock:
+            snapshot = dict((name, list(samples)) for name, samples in self.samples.items())
+            counts = dict(self.counts)
+        endpoints = []
+        for name, samples in snapshot.items():
+            totals = sorted(sample.total for sample in samples)
+            size = len(samples)
+            endpoints.append({
+                'name': name,
+                'requests': counts[name],
+                'window': size,
+                'time': sum(totals),
+                'p50': percentile(totals, 0.50),
+                'p95': percentile(totals, 0.95),
+                'p99': percentile(totals, 0.99),
+                'db_time': sum(sample.db_time for sample in samples) / size,
+                'db_queries': float(sum(sample.db_queries for sample in samples)) / size,
+                'template_time': sum(sample.template_time for sample in samples) / size,
+            })
+        return sorted(endpoints, key=lambda endpoint: endpoint['time'], reverse=True)
+
+    def slowest_queries(self, limit=20):
+        with self.lock:
+            queries = list(self.slow_queries)
+        return sorted(queries, key=lambda query: query.duration, reverse=True)[:limit]
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.counts.clear()
+            self.slow_queries.clear()
+
+
+class AdmissionStats(object):
+    """
+    Outcomes of the write admission control (see blog/admission.py), and
+    a rolling window of the time admitted writes waited for a slot.
+    """
+    outcomes = ('admitted', 'queued', 'throttled', 'shed')
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.counts = collections.Counter()
+        self.waits = collections.deque(maxlen=window)
+
+    def record(self, outcome, wait=None):
+        with self.lock:
+            self.counts[outcome] += 1
+            if wait is not None:
+                self.waits.append(wait * 1000)
+
+    def summary(self):
+        """
+        Returns the count of every outcome and the wait percentiles, in
+        milliseconds.
+        """
+        with self.lock:
+            counts = dict(self.counts)
+            waits = sorted(self.waits)
+        summary = dict((outcome, counts.get(outcome, 0)) for outcome in self.outcomes)
+        summary.update({
+            'wait_p50': percentile(waits, 0.50),
+            'wait_p95': percentile(waits, 0.95),
+            'wait_max': waits[-1] if waits else 0.0,
+        })
+        return summary
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+            self.waits.clear()
+
+
+request_stats = RequestStats(
+    window=getattr(settings, 'BLOG_PERF_WINDOW', 1000),
+    slow_query_log=getattr(settings, 'BLOG_PERF_SLOW_QUERY_LOG', 100),
+)
+
+admission_stats = AdmissionStats(window=getattr(settings, 'BLOG_PERF_WINDOW', 1000))
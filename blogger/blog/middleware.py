@@ -0,0 +1,144 @@
+import math
+import random
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+from . import admission, routers
+from .metrics import Sample, admission_stats, request_stats
+
+
+class PerformanceMiddleware(object):
+    """
+    Times every request and reports it in a ``Server-Timing`` header.
+
+    A ``BLOG_PERF_SAMPLE_RATE`` fraction of requests is also instrumented
+    in detail: queries are timed by Django's debug cursor wrapper, template
+    rendering through a post-render callback, and the sample is recorded
+    in ``blog.metrics.request_stats``.  Unsampled requests only pay for two
+    clock reads.
+
+    Should be first in ``MIDDLEWARE_CLASSES`` so it measures the others.
+    """
+    def process_request(self, request):
+        request._perf_start = time.time()
+        request._perf_sampled = random.random() < getattr(settings, 'BLOG_PERF_SAMPLE_RATE', 0.01)
+        if request._perf_sampled:
+            request._perf_template_time = 0.0
+            request._perf_connections = []
+            for connection in connections.all():
+                request._perf_connections.append(
+                    (connection, connection.force_debug_cursor, len(connection.queries_log)))
+                connection.force_debug_cursor = True
+
+    def process_template_response(self, request, response):
+        # Being first in MIDDLEWARE_CLASSES, this runs right before rendering.
+        if getattr(request, '_perf_sampled', False):
+            start = time.time()
+
+            def rendered(response):
+                request._perf_template_time += time.time() - start
+            response.add_post_render_callback(rendered)
+        return response
+
+    def process_response(self, request, response):
+        start = getattr(request, '_perf_start', None)
+        if start is None:
+            return response
+        total = (time.time() - start) * 1000
+        timings = []
+        if request._perf_sampled:
+            queries = []
+            for connection, force_debug_cursor, offset in request._perf_connections:
+                connection.force_debug_cursor = force_debug_cursor
+                queries.extend(list(connection.queries_log)[offset:])
+            db_time = sum(float(query['time']) for query in queries) * 1000
+            template_time = request._perf_template_time * 1000
+            threshold = getattr(settings, 'BLOG_PERF_SLOW_QUERY_MS', 50)
+            slow_queries = [(float(query['time']) * 1000, query['sql']) for query in queries
+                            if float(query['time']) * 1000 >= threshold]
+            match = getattr(request, 'resolver_match', None)
+            url_name = match.view_name if match else '<unresolved>'
+            request_stats.record(url_name, Sample(total, db_time, len(queries), template_time),
+                                 slow_queries)
+            timings.append('db;dur=%.2f;desc="%d queries"' % (db_time, len(queries)))
+            timings.append('tpl;dur=%.2f' % template_time)
+        timings.append('total;dur=%.2f' % total)
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+
+class ReplicaPinningMiddleware(object):
+    """
+    Read-your-writes for ``blog.routers.PrimaryReplicaRouter``: a request
+    that wrote to the primary gets a short-lived cookie, and requests
+    carrying it read from the primary too, until the replicas caught up.
+    Unsafe methods read from the primary throughout, and count as writes
+    when they succeed: bulk updates send no signals.
+    """
+    cookie_name = 'blog_primary'
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def process_request(self, request):
+        routers.reset()
+        if request.COOKIES.get(self.cookie_name) or request.method not in self.safe_methods:
+            routers.pin_primary()
+
+    def process_response(self, request, response):
+        if routers.has_written() or (request.method not in self.safe_methods
+                                     and response.status_code < 400):
+            response.set_cookie(self.cookie_name, '1', httponly=True,
+                                max_age=getattr(settings, 'BLOG_REPLICA_PIN_SECONDS', 5))
+        routers.reset()
+        return response
+
+
+class AdmissionControlMiddleware(object):
+    """
+    Sheds write load before it reaches the database (see
+    blog/admission.py): writes (unsafe methods) over their client's
+    token bucket get a 429, those finding every write slot of the worker
+    busy and the wait queue full, or waiting too long, a 503, both with
+    a ``Retry-After``.  Reads pass straight through.
+
+    Goes before the session and auth middleware, so a refused write costs
+    no query.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def refuse(self, status, retry_after, reason):
+        response = HttpResponse(reason, status=status, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(max(1, int(math.ceil(retry_after))))
+        return response
+
+    def process_request(self, request):
+        if request.method in self.safe_methods:
+            return None
+        rate = getattr(settings, 'BLOG_ADMISSION_RATE', 1.0)
+        if rate:
+            wait = admission.take_token(request.META.get('REMOTE_ADDR', ''), rate,
+                                        getattr(settings, 'BLOG_ADMISSION_BURST', 10))
+            if wait:
+                admission_stats.record('throttled')
+                return self.refuse(429, wait, "Too many writes, retry later.")
+        if getattr(settings, 'BLOG_ADMISSION_MAX_WRITES', 4):
+            timeout = getattr(settings, 'BLOG_ADMISSION_QUEUE_TIMEOUT', 1.0)
+            gate = admission.get_gate()
+            wait = gate.acquire(timeout)
+            if wait is None:
+                admission_stats.record('shed')
+                return self.refuse(503, timeout, "Too busy, retry later.")
+            request._admission_gate = gate
+            if wait:
+                admission_stats.record('queued')
+            admission_stats.record('admitted', wait)
+        return None
+
+    def process_response(self, request, response):
+        gate = getattr(request, '_admission_gate', None)
+        if gate is not None:
+            del request._admission_gate
+            gate.release()
+        return response
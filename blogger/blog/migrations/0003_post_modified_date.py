@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copy_created_date(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Post.objects.update(modified_date=F('created_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_post_created_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='modified_date',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='modified date'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_post_modified_date'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            ["CREATE VIRTUAL TABLE blog_post_fts USING fts5("
+             "title, description, tokenize='porter unicode61')"],
+            ["DROP TABLE blog_post_fts"],
+        ),
+        migrations.RunSQL(
+            ["INSERT INTO blog_post_fts (rowid, title, description) "
+             "SELECT id, title, description FROM blog_post"],
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.6 on 2026-10-17 04:49
+from __future__ import unicode_literals
+
+import blog.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_post_body'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postbody',
+            name='html',
+            field=blog.fields.CompressedTextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='postbody',
+            name='renderer',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='postbody',
+            name='source_hash',
+            field=models.CharField(default='', max_length=40),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.6 on 2026-10-17 04:52
+from __future__ import unicode_literals
+
+import collections
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def count_months(apps, schema_editor):
+    # Like blog.archive.rebuild, on the models as of this migration.
+    Post = apps.get_model('blog', 'Post')
+    ArchiveMonth = apps.get_model('blog', 'ArchiveMonth')
+    using = schema_editor.connection.alias
+    dates = Post.objects.using(using).order_by('id').values_list('id', 'created_date')
+    counts = collections.Counter()
+    last_pk = 0
+    while True:
+        rows = list(dates.filter(id__gt=last_pk)[:1000])
+        if not rows:
+            break
+        for pk, created_date in rows:
+            if timezone.is_aware(created_date):
+                created_date = timezone.localtime(created_date)
+            counts[created_date.year, created_date.month] += 1
+        last_pk = rows[-1][0]
+    ArchiveMonth.objects.using(using).bulk_create(
+        ArchiveMonth(year=year, month=month, count=count) for (year, month), count in counts.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_view_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveMonth',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivemonth',
+            unique_together=set([('year', 'month')]),
+        ),
+        migrations.RunPython(count_months, migrations.RunPython.noop),
+    ]
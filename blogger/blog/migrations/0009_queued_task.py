@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.6 on 2026-10-17 05:01
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_archive_month'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('args', models.TextField(default='[]')),
+                ('key', models.CharField(max_length=200, null=True, unique=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True, verbose_name='created date')),
+                ('run_after', models.DateTimeField(db_index=True, verbose_name='run after')),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('locked_by', models.CharField(db_index=True, default='', max_length=40)),
+                ('locked_until', models.DateTimeField(null=True, verbose_name='locked until')),
+                ('last_error', models.TextField(default='')),
+            ],
+        ),
+    ]
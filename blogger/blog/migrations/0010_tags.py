@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.6 on 2026-10-17 05:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_queued_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_date', models.DateTimeField(verbose_name='created date')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='blog.Post')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('slug', models.SlugField(unique=True)),
+                ('post_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='post count')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='tag',
+            index_together=set([('post_count', 'id')]),
+        ),
+        migrations.AddField(
+            model_name='posttag',
+            name='tag',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='blog.Tag'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='tags',
+            field=models.ManyToManyField(related_name='posts', through='blog.PostTag', to='blog.Tag'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='posttag',
+            unique_together=set([('post', 'tag')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='posttag',
+            index_together=set([('tag', 'created_date', 'id')]),
+        ),
+    ]
@@ -1,10 +1,26 @@
-from django.db import models
+import datetime
+
+from django.db import models, router, transaction
 from django.core.urlresolvers import reverse
+from django.utils.safestring import mark_safe
+
+from . import markup
+from .fields import CompressedTextField
 
 class Post(models.Model):
     title = models.CharField(max_length=50)
     description = models.CharField(max_length=200)
     created_date = models.DateTimeField('created date')
+    modified_date = models.DateTimeField('modified date', auto_now=True)
+    # Incremented in batches by blog.counters.
+    view_count = models.PositiveIntegerField('view count', default=0, editable=False)
+    # Changed through blog.tagging, which keeps the tag counts.
+    tags = models.ManyToManyField('Tag', through='PostTag', related_name='posts')
+
+    class Meta:
+        # Backs the keyset pagination of PostList, see blog/pagination.py,
+        # and PostPopular.
+        index_together = [('created_date', 'id'), ('view_count', 'id')]
 
     def __str__(self):
         return self.title
@@ -12,4 +28,142 @@ class Post(models.Model):
     def get_absolute_url(self):
             return reverse('blog:list')
 
+    def get_post_body(self):
+        """
+        Returns the PostBody, or None.  Loaded on first access, unless the
+        queryset used ``select_related('post_body')``.
+        """
+        if not self.pk:
+            return None
+        try:
+            return self.post_body
+        except PostBody.DoesNotExist:
+            return None
+
+    @property
+    def body(self):
+        """
+        The long-form Markdown text, kept in PostBody so that queries on
+        posts never read it.  Saved along with the post.
+        """
+        if not hasattr(self, '_body'):
+            post_body = self.get_post_body()
+            self._body = post_body.text if post_body else ''
+            self._body_changed = False
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+        self._body_changed = True
+
+    @property
+    def body_html(self):
+        """
+        The body's HTML, as rendered when it was saved.
+        """
+        post_body = self.get_post_body()
+        return mark_safe(post_body.html if post_body else '')
+
+    def save(self, *args, **kwargs):
+        if not getattr(self, '_body_changed', False):
+            return super(Post, self).save(*args, **kwargs)
+        adding = self._state.adding
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super(Post, self).save(*args, **kwargs)
+            post_body = None if adding else self.get_post_body()
+            if post_body is None:
+                post_body = self.post_body = PostBody(post=self)
+            post_body.text = self._body
+            post_body.save(using=self._state.db)
+        self._body_changed = False
+
+
+class PostBody(models.Model):
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True,
+                                related_name='post_body')
+    text = CompressedTextField(default='')
+    # Rendered from text by blog.markup when saved.
+    html = CompressedTextField(default='')
+    source_hash = models.CharField(max_length=40, default='')
+    renderer = models.CharField(max_length=50, default='')
+
+    def render(self, force=False):
+        """
+        Renders the html, unless it is up to date with the text and the
+        renderer.  Returns whether it did.
+        """
+        source_hash = markup.content_hash(self.text)
+        if not force and source_hash == self.source_hash and self.renderer == markup.RENDERER:
+            return False
+        self.html = markup.render(self.text)
+        self.source_hash = source_hash
+        self.renderer = markup.RENDERER
+        return True
+
+    def save(self, *args, **kwargs):
+        self.render()
+        super(PostBody, self).save(*args, **kwargs)
+
+
+class ArchiveMonth(models.Model):
+    """
+    Number of posts created in a month, kept up to date by blog.archive.
+    """
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('year', 'month')]
 
+    @property
+    def date(self):
+        return datetime.date(self.year, self.month, 1)
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=50, unique=True)
+    # Kept up to date by blog.tagging.
+    post_count = models.PositiveIntegerField('post count', default=0, editable=False)
+
+    class Meta:
+        # Backs the tag cloud.
+        index_together = [('post_count', 'id')]
+
+    def __str__(self):
+        return self.name
+
+
+class PostTag(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='post_tags')
+    # The post's, so a tag's posts paginate on one index range, see
+    # blog.views.PostTagList.
+    created_date = models.DateTimeField('created date')
+
+    class Meta:
+        unique_together = [('post', 'tag')]
+        index_together = [('tag', 'created_date', 'id')]
+
+
+class QueuedTask(models.Model):
+    """
+    A background task waiting in the database queue of blog.tasks.
+    """
+    name = models.CharField(max_length=200)
+    # JSON list of the arguments.
+    args = models.TextField(default='[]')
+    # Only one pending task per key; cleared once a worker claims it.
+    key = models.CharField(max_length=200, null=True, unique=True)
+    created_date = models.DateTimeField('created date', auto_now_add=True)
+    run_after = models.DateTimeField('run after', db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    locked_by = models.CharField(max_length=40, default='', db_index=True)
+    locked_until = models.DateTimeField('locked until', null=True)
+    last_error = models.TextField(default='')
+
+    def __str__(self):
+        return '%s%s' % (self.name, self.args)
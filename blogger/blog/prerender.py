@@ -0,0 +1,219 @@
+"""
+Static pre-rendering of the public blog pages.
+
+``build`` renders the post list, every page of its cursor chain and every
+post's details page into ``BLOG_PRERENDER_ROOT``, so the front-end server
+can answer anonymous reads from disk and only pass writes (and anything
+it has no file for) to Django::
+
+    location /blog/ {
+        set $page index;
+        if ($arg_cursor ~ "^[A-Za-z0-9_-]+$") { set $page index.$arg_cursor; }
+        try_files $uri$page.html @django;
+    }
+
+i.e. ``/blog/`` is ``blog/index.html``, ``/blog/?cursor=X`` is
+``blog/index.X.html`` and ``/blog/5/`` is ``blog/5/index.html``.  Files
+are swapped in atomically, readers never see a half written page.
+
+After a post is saved or deleted, ``regenerate`` rewrites only the pages
+that changed: the post's details page, the first
+``BLOG_PRERENDER_FRONT_PAGES`` list pages and the already rendered list
+pages listing the post.  Bulk edits and deletes (blog/bulk.py) queue the
+same for each of their posts; bulk imports skip it, rerun ``prerender``
+after them.
+"""
+import errno
+import multiprocessing
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.urlresolvers import resolve, reverse
+from django.db import connections
+from django.http import Http404
+from django.test import RequestFactory
+
+from .bulk import batched
+from .models import Post
+from .pagination import encode_cursor
+from .views import PostList
+
+# Pages written per task by the parallel workers.
+CHUNK_SIZE = 100
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def get_root():
+    return getattr(settings, 'BLOG_PRERENDER_ROOT', None)
+
+
+def page_path(root, url, cursor=None):
+    """
+    Returns the file a page is written to, see the module docstring.
+    """
+    filename = 'index.%s.html' % cursor if cursor else 'index.html'
+    return os.path.join(root, *(url.strip('/').split('/') + [filename]))
+
+
+def render(url, cursor=None):
+    """
+    Renders the page at ``url`` (and ``cursor``) through its view, without
+    the middleware.  Returns the content, or None unless it is a 200.
+    """
+    request = RequestFactory().get(url, {'cursor': cursor} if cursor else {})
+    request.resolver_match = match = resolve(url)
+    # Not a reader, e.g. for the view counts.
+    request.is_prerender = True
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        return None
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        return None
+    return response.content
+
+
+def write(path, content):
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(temp_path, 0o644)
+        _replace(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def render_pages(root, pages):
+    """
+    Writes every ``(url, cursor)`` page of ``pages`` under ``root``, and
+    removes the files of those that no longer exist.  Returns the paths
+    written.
+    """
+    written = []
+    for url, cursor in pages:
+        path = page_path(root, url, cursor)
+        content = render(url, cursor)
+        if content is None:
+            remove(path)
+        else:
+            write(path, content)
+            written.append(path)
+    return written
+
+
+def _render_chunk(args):
+    return render_pages(*args)
+
+
+def list_pages(limit=None):
+    """
+    Returns the ``(url, cursor)`` of the list pages, newest first, as the
+    Older links chain them.  ``limit`` is the number of pages wanted.
+    """
+    per_page = PostList.paginate_by
+    url = reverse('blog:list')
+    rows = Post.objects.order_by('-created_date', '-id').values_list('created_date', 'id')
+    if limit is not None:
+        rows = rows[:per_page * (limit - 1) + 1]
+    pages = [(url, None)]
+    cursor = None
+    for rank, (created_date, pk) in enumerate(rows.iterator(), 1):
+        # A page boundary only gets a link if a row follows it.
+        if cursor is not None:
+            pages.append((url, cursor))
+            cursor = None
+        if rank % per_page == 0:
+            cursor = encode_cursor(created_date, pk)
+    return pages
+
+
+def details_pages(pks=None):
+    if pks is None:
+        pks = Post.objects.order_by('id').values_list('id', flat=True).iterator()
+    return [(reverse('blog:details', args=(pk,)), None) for pk in pks]
+
+
+def sweep(root, keep):
+    """
+    Removes the pre-rendered pages under ``root`` that are not in ``keep``.
+    """
+    removed = 0
+    top = os.path.join(root, *reverse('blog:list').strip('/').split('/'))
+    for directory, dirnames, filenames in os.walk(top):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            if filename.startswith('index.') and filename.endswith('.html') and path not in keep:
+                remove(path)
+                removed += 1
+    return removed
+
+
+def build(root, workers=1):
+    """
+    Renders every page into ``root`` with ``workers`` processes, removes
+    stale pages and returns the number of pages written.
+
+    The workers are forked, so more than one needs a database that is not
+    in memory.
+    """
+    pages = list_pages() + details_pages()
+    if workers > 1:
+        # Forked children must open their own connections.
+        connections.close_all()
+        pool = multiprocessing.Pool(workers)
+        try:
+            chunks = [(root, chunk) for chunk in batched(pages, CHUNK_SIZE)]
+            written = [path for paths in pool.imap_unordered(_render_chunk, chunks)
+                       for path in paths]
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        written = render_pages(root, pages)
+    sweep(root, set(written))
+    return len(written)
+
+
+def regenerate(pk, created_date, root=None):
+    """
+    Rewrites the pages affected by a change to the post ``pk`` created at
+    ``created_date``, which may have been deleted.  Returns the number of
+    pages written.
+    """
+    root = root or get_root()
+    if not root:
+        return 0
+    pages = list_pages(getattr(settings, 'BLOG_PRERENDER_FRONT_PAGES', 5))
+    # A list page lists the post if its cursor is one of the posts right
+    # before it; only those already rendered are kept up to date.
+    newer = (Post.objects.filter(created_date__gte=created_date)
+             .exclude(created_date=created_date, id__lte=pk)
+             .order_by('created_date', 'id')
+             .values_list('created_date', 'id')[:PostList.paginate_by])
+    url = reverse('blog:list')
+    for date, newer_pk in newer:
+        page = (url, encode_cursor(date, newer_pk))
+        if page not in pages and os.path.exists(page_path(root, *page)):
+            pages.append(page)
+    pages += details_pages([pk])
+    return len(render_pages(root, pages))
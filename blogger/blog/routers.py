@@ -0,0 +1,77 @@
+"""
+Primary/replica database routing for the blog app.
+
+Writes always go to the primary (``default``); reads are spread over the
+``BLOG_REPLICA_DATABASES`` aliases.  Replicas lag behind, so once a
+thread has written (saved or deleted a blog model, see blog/signals.py),
+its reads stay on the primary for the rest of the request, and
+``ReplicaPinningMiddleware`` carries that over to the same client's
+requests for ``BLOG_REPLICA_PIN_SECONDS``.  Other apps (auth, sessions,
+admin) are left on the primary.
+
+``db_for_write`` has no side effects: Django also asks it where to go
+for things that are not writes.
+
+Only what was read from the primary is cached (see blog/cache.py): a
+lagging replica would store old data under the new cache versions, and
+serve it to the writer too.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_state = threading.local()
+
+
+def pin_primary():
+    _state.pinned = True
+
+
+def reset():
+    _state.pinned = False
+    _state.wrote = False
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False) or getattr(_state, 'wrote', False)
+
+
+def mark_written():
+    _state.wrote = True
+
+
+def has_written():
+    return getattr(_state, 'wrote', False)
+
+
+def reads_primary():
+    """
+    Whether this thread's blog reads go to the primary.
+    """
+    return is_pinned() or not getattr(settings, 'BLOG_REPLICA_DATABASES', [])
+
+
+class PrimaryReplicaRouter(object):
+    app_labels = ('blog',)
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in self.app_labels or is_pinned():
+            return None
+        replicas = getattr(settings, 'BLOG_REPLICA_DATABASES', [])
+        if replicas:
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in self.app_labels:
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        databases = set([DEFAULT_DB_ALIAS] + list(getattr(settings, 'BLOG_REPLICA_DATABASES', [])))
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,187 @@
+"""
+Full-text search over post titles and descriptions.
+
+Backed by the ``blog_post_fts`` SQLite FTS5 table created in migration
+0004.  The table keeps its own copy of the indexed columns with the post
+id as rowid, and is kept in sync by the post signals (see
+blog/signals.py) rather than by SQL triggers, which SQLite drops
+whenever a migration rebuilds ``blog_post``.  Anything that writes posts
+without signals (``bulk_create``, ``QuerySet.update``) must call
+``index_posts``/``unindex_posts`` or ``rebuild`` itself.
+"""
+import re
+
+from django.db import connections, router, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .pagination import InvalidCursor, decode_token, encode_token
+
+FTS_TABLE = 'blog_post_fts'
+
+# bm25() weights of the title and description columns.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Matches are marked with control characters, which survive escaping,
+# and only turned into <mark> tags once the text is HTML-safe.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+SEARCH_SQL = """
+    SELECT id, score, title, snippet FROM (
+        SELECT rowid AS id,
+               bm25({table}, %s, %s) AS score,
+               highlight({table}, 0, %s, %s) AS title,
+               snippet({table}, 1, %s, %s, '...', 24) AS snippet
+        FROM {table} WHERE {table} MATCH %s
+    )
+    {where}
+    ORDER BY score, id
+    LIMIT %s
+"""
+
+
+class SearchPage(object):
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _write_connection():
+    return connections[router.db_for_write(Post)]
+
+
+def build_match_query(q):
+    """
+    Turns free text into an FTS5 query that matches posts containing every
+    word.  Each word is quoted, so FTS5 operators in user input are inert.
+    """
+    words = re.findall(r'\w+', q, re.UNICODE)
+    return ' '.join('"%s"' % word for word in words)
+
+
+def index_posts(posts, using=None):
+    rows = [(post.pk, post.title, post.description) for post in posts]
+    if not rows:
+        return
+    connection = connections[using] if using else _write_connection()
+    with connection.cursor() as cursor:
+        cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE,
+                           [(row[0],) for row in rows])
+        cursor.executemany(
+            'INSERT INTO %s (rowid, title, description) VALUES (%%s, %%s, %%s)' % FTS_TABLE,
+            rows)
+
+
+def index_after(pk, using=None):
+    """
+    (Re)indexes every post with an id greater than ``pk`` with one
+    set-based insert, e.g. the rows a ``bulk_create`` just appended.
+    """
+    connection = connections[using] if using else _write_connection()
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid > %%s' % FTS_TABLE, [pk])
+        cursor.execute(
+            'INSERT INTO %s (rowid, title, description) '
+            'SELECT id, title, description FROM %s WHERE id > %%s'
+            % (FTS_TABLE, Post._meta.db_table), [pk])
+
+
+def reindex_posts(pks, using=None):
+    """
+    Reindexes the posts ``pks`` from ``blog_post`` with one set-based
+    insert, e.g. after a ``QuerySet.update()``.
+    """
+    pks = list(pks)
+    if not pks:
+        return
+    placeholders = ', '.join(['%s'] * len(pks))
+    connection = connections[using] if using else _write_connection()
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid IN (%s)' % (FTS_TABLE, placeholders), pks)
+        cursor.execute(
+            'INSERT INTO %s (rowid, title, description) '
+            'SELECT id, title, description FROM %s WHERE id IN (%s)'
+            % (FTS_TABLE, Post._meta.db_table, placeholders), pks)
+
+
+def unindex_posts(pks, using=None):
+    pks = list(pks)
+    if not pks:
+        return
+    connection = connections[using] if using else _write_connection()
+    with connection.cursor() as cursor:
+        cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE,
+                           [(pk,) for pk in pks])
+
+
+def rebuild(using=None):
+    """
+    Rebuilds the whole index from ``blog_post`` with one set-based insert
+    and merges the FTS b-trees afterwards.  Returns the number of posts.
+    """
+    using = using or router.db_for_write(Post)
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % FTS_TABLE)
+            cursor.execute(
+                'INSERT INTO %s (rowid, title, description) '
+                'SELECT id, title, description FROM %s' % (FTS_TABLE, Post._meta.db_table))
+            cursor.execute("INSERT INTO %s (%s) VALUES ('optimize')" % (FTS_TABLE, FTS_TABLE))
+            cursor.execute('SELECT COUNT(*) FROM %s' % FTS_TABLE)
+            return cursor.fetchone()[0]
+
+
+def _highlight(text):
+    return mark_safe(escape(text).replace(HIGHLIGHT_START, '<mark>')
+                                 .replace(HIGHLIGHT_END, '</mark>'))
+
+
+def search(q, cursor=None, per_page=10):
+    """
+    Returns the ``SearchPage`` of posts matching ``q`` best first (lowest
+    bm25 score), continuing after ``cursor``.  Each result is a dict with
+    the post ``id`` and HTML-safe highlighted ``title`` and ``snippet``.
+    """
+    match = build_match_query(q)
+    if not match:
+        return SearchPage([])
+    params = [TITLE_WEIGHT, DESCRIPTION_WEIGHT,
+              HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END, match]
+    where = ''
+    if cursor:
+        score, pk = decode_token(cursor, 2)
+        try:
+            score, pk = float(score), int(pk)
+        except ValueError:
+            raise InvalidCursor(cursor)
+        where = 'WHERE score > %s OR (score = %s AND id > %s)'
+        params.extend([score, score, pk])
+    params.append(per_page + 1)
+
+    with connections[router.db_for_read(Post)].cursor() as c:
+        c.execute(SEARCH_SQL.format(table=FTS_TABLE, where=where), params)
+        rows = c.fetchall()
+
+    results = [{
+        'id': pk,
+        'score': score,
+        'title': _highlight(title),
+        'snippet': _highlight(snippet),
+    } for pk, score, title, snippet in rows[:per_page]]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = results[-1]
+        next_cursor = encode_token(repr(last['score']), last['id'])
+    return SearchPage(results, next_cursor)
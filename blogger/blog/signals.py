@@ -0,0 +1,97 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import archive, cache, prerender, routers, search, tagging, tasks
+from .models import Post, PostTag
+
+
+# Only once committed: a request reading the post before then would
+# cache the old version under the new keys.
+
+@receiver(post_save, sender=Post, dispatch_uid='blog.invalidate_post_cache_on_save')
+def invalidate_post_cache_on_save(sender, instance, using, **kwargs):
+    transaction.on_commit(partial(cache.invalidate_post, instance.pk, instance.modified_date),
+                          using=using)
+
+
+@receiver(post_delete, sender=Post, dispatch_uid='blog.invalidate_post_cache_on_delete')
+def invalidate_post_cache_on_delete(sender, instance, using, **kwargs):
+    transaction.on_commit(partial(cache.invalidate_post, instance.pk), using=using)
+
+
+@receiver(post_save, sender=Post, dispatch_uid='blog.index_post_on_save')
+def index_post_on_save(sender, instance, using, **kwargs):
+    search.index_posts([instance], using=using)
+
+
+@receiver(post_delete, sender=Post, dispatch_uid='blog.unindex_post_on_delete')
+def unindex_post_on_delete(sender, instance, using, **kwargs):
+    search.unindex_posts([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Post, dispatch_uid='blog.count_post_on_save')
+def count_post_on_save(sender, instance, created, using, **kwargs):
+    if created:
+        archive.add([instance.created_date], using=using)
+
+
+@receiver(post_delete, sender=Post, dispatch_uid='blog.uncount_post_on_delete')
+def uncount_post_on_delete(sender, instance, using, **kwargs):
+    archive.add([instance.created_date], -1, using=using)
+
+
+@receiver(post_save, sender=Post, dispatch_uid='blog.sync_tag_dates_on_save')
+def sync_tag_dates_on_save(sender, instance, created, using, **kwargs):
+    if not created:
+        # Usually no rows, the date hardly ever changes.
+        (PostTag.objects.using(using).filter(post=instance).exclude(created_date=instance.created_date)
+         .update(created_date=instance.created_date))
+
+
+@receiver(pre_delete, sender=Post, dispatch_uid='blog.untag_post_on_delete')
+def untag_post_on_delete(sender, instance, using, **kwargs):
+    tagging.untag_posts([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Post, dispatch_uid='blog.prerender_post_on_save')
+@receiver(post_delete, sender=Post, dispatch_uid='blog.prerender_post_on_delete')
+def prerender_post(sender, instance, using, **kwargs):
+    if prerender.get_root():
+        tasks.enqueue(tasks.regenerate_prerendered,
+                      (instance.pk, instance.created_date.isoformat()),
+                      key='prerender:%s' % instance.pk, using=using)
+
+
+@receiver(post_save, sender=Post, dispatch_uid='blog.warm_post_pages_on_save')
+def warm_post_pages(sender, instance, using, **kwargs):
+    if getattr(settings, 'BLOG_WARM_PAGES', False):
+        tasks.enqueue(tasks.warm_post_pages, (instance.pk,),
+                      key='warm:%s' % instance.pk, using=using)
+
+
+# A post_delete receiver for every model would keep Django from deleting
+# querysets without loading them; other deletes come with a Post's or
+# from an unsafe request, which ReplicaPinningMiddleware pins anyway.
+@receiver(post_save, dispatch_uid='blog.pin_primary_on_save')
+@receiver(post_delete, sender=Post, dispatch_uid='blog.pin_primary_on_delete')
+def pin_primary_after_write(sender, using, **kwargs):
+    # Read-your-writes, see blog/routers.py.
+    if sender._meta.app_label in routers.PrimaryReplicaRouter.app_labels and using == DEFAULT_DB_ALIAS:
+        routers.mark_written()
+
+
+@receiver(connection_created, dispatch_uid='blog.configure_sqlite')
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Switches SQLite to write-ahead logging, so readers no longer block on
+    the writer (and vice versa).  Executed on the raw connection to stay
+    out of query counts.
+    """
+    if connection.vendor == 'sqlite' and getattr(settings, 'BLOG_SQLITE_WAL', True):
+        connection.connection.execute('PRAGMA journal_mode=WAL')
+        connection.connection.execute('PRAGMA synchronous=NORMAL')
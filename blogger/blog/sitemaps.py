@@ -0,0 +1,93 @@
+"""
+Sharded sitemap of the post details pages.
+
+Shard ``n`` lists the posts with ids ``n * size + 1`` to ``(n + 1) *
+size``, where ``size`` is ``BLOG_SITEMAP_SHARD_SIZE`` (50,000, the
+protocol's limit), and the index lists one shard per id range up to the
+highest id.  Shards are rendered by streaming their id range, and cached
+under their own version (see blog/cache.py), which only changes when a
+post in their range does; crawling an unchanged sitemap is a cache read
+per request.  The index is cached until any post changes.
+"""
+from django.core.urlresolvers import reverse
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.html import escape
+
+from . import cache
+from .models import Post
+
+NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def shard_count():
+    last_pk = Post.objects.aggregate(last_pk=Max('id'))['last_pk']
+    return cache.sitemap_shard(last_pk) + 1 if last_pk else 0
+
+
+def w3c_datetime(value):
+    if timezone.is_aware(value):
+        value = value.astimezone(timezone.utc)
+    return value.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+def render_shard(shard, base_url):
+    """
+    Returns the ``urlset`` document of ``shard`` and the last
+    modification time of its posts (None if it has none).
+    """
+    size = cache.sitemap_shard_size()
+    rows = (Post.objects.filter(id__gt=shard * size, id__lte=(shard + 1) * size)
+            .order_by('id').values_list('id', 'created_date', 'modified_date'))
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="%s">\n' % NAMESPACE]
+    last_modified = None
+    for pk, created_date, modified_date in rows.iterator():
+        modified = modified_date or created_date
+        last_modified = max(last_modified, modified) if last_modified else modified
+        parts.append('<url><loc>%s%s</loc><lastmod>%s</lastmod></url>\n' % (
+            escape(base_url), reverse('blog:details', args=(pk,)), w3c_datetime(modified)))
+    parts.append('</urlset>\n')
+    return ''.join(parts).encode('utf-8'), last_modified
+
+
+def render_index(base_url):
+    """
+    Returns the ``sitemapindex`` document, with the shards' last
+    modification times as far as they are known.
+    """
+    shards = range(shard_count())
+    modified = cache.sitemap_last_modified(shards)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="%s">\n' % NAMESPACE]
+    for shard in shards:
+        lastmod = '<lastmod>%s</lastmod>' % w3c_datetime(modified[shard]) if shard in modified else ''
+        parts.append('<sitemap><loc>%s%s</loc>%s</sitemap>\n' % (
+            escape(base_url), reverse('blog:sitemap-shard', args=(shard,)), lastmod))
+    parts.append('</sitemapindex>\n')
+    return ''.join(parts).encode('utf-8')
+
+
+def get_shard(shard, base_url, host):
+    """
+    Returns the cached ``urlset`` document of ``shard``, rendering it on a
+    miss, or None if there is no such shard.
+    """
+    key = cache.sitemap_shard_key(host, shard)
+    cached = cache.get_page(key)
+    if cached is None:
+        content, last_modified = render_shard(shard, base_url)
+        if last_modified:
+            cache.set_sitemap_last_modified(shard, last_modified)
+        elif shard >= shard_count():
+            return None
+        cached = content
+        cache.set_page(key, cached, None)
+    return cached
+
+
+def get_index(base_url, host):
+    key = cache.sitemap_index_key(host)
+    cached = cache.get_page(key)
+    if cached is None:
+        cached = render_index(base_url)
+        cache.set_page(key, cached)
+    return cached
@@ -0,0 +1,108 @@
+"""
+Static files storage that bundles, fingerprints and precompresses.
+
+At ``collectstatic`` time the files listed in ``BLOG_STATIC_BUNDLES`` are
+concatenated into their bundle, every file gets a content-hashed copy
+recorded in the manifest (with ``url()`` references rewritten), and the
+hashed copies of text assets get ``.gz`` (and, if the ``brotli`` package
+is installed, ``.br``) siblings for ``blog.views.StaticAsset`` to pick
+from, so nothing is compressed per request.
+"""
+import gzip
+import io
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import HashedFilesMixin, ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.eot', '.ttf', '.txt', '.html', '.json', '.xml')
+
+
+def gzip_compress(data):
+    buffer = io.BytesIO()
+    # A fixed mtime keeps the output identical across collectstatic runs.
+    with gzip.GzipFile(filename='', mode='wb', compresslevel=9, fileobj=buffer, mtime=0) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # (suffix, Content-Encoding, compressor), in order of preference.
+    encodings = [('.br', 'br', brotli and brotli.compress), ('.gz', 'gzip', gzip_compress)]
+
+    def url(self, name, force=False):
+        # Files that were not collected yet (development, tests) fall back
+        # to their plain url instead of failing the whole page.
+        try:
+            return super(CompressedManifestStaticFilesStorage, self).url(name, force)
+        except ValueError:
+            if force:
+                raise
+            return super(HashedFilesMixin, self).url(name)
+
+    def is_immutable(self, name):
+        """
+        Whether ``name`` is a content-hashed file, safe to cache forever.
+        """
+        hashed_names = getattr(self, '_hashed_names', None)
+        if hashed_names is None:
+            hashed_names = self._hashed_names = set(self.hashed_files.values())
+        return name in hashed_names
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        paths = paths.copy()
+        for bundle, parts in getattr(settings, 'BLOG_STATIC_BUNDLES', {}).items():
+            self.build_bundle(bundle, parts, paths)
+            paths[bundle] = (self, bundle)
+
+        hashed_names = []
+        processed_files = super(CompressedManifestStaticFilesStorage, self).post_process(
+            paths, dry_run, **options)
+        for name, hashed_name, processed in processed_files:
+            if hashed_name:
+                hashed_names.append(hashed_name)
+            yield name, hashed_name, processed
+        for hashed_name in hashed_names:
+            self.compress(hashed_name)
+        self._hashed_names = None
+
+    def build_bundle(self, bundle, parts, paths):
+        contents = []
+        for part in parts:
+            storage, path = paths[part]
+            with storage.open(path) as f:
+                contents.append(f.read())
+        if self.exists(bundle):
+            self.delete(bundle)
+        self._save(bundle, ContentFile(b'\n'.join(contents)))
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        with self.open(name) as f:
+            data = f.read()
+        for suffix, encoding, compressor in self.encodings:
+            if compressor is None:
+                continue
+            compressed = compressor(data)
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            if len(compressed) < len(data):
+                self._save(name + suffix, ContentFile(compressed))
+
+    def precompressed(self, name, accepted_encodings):
+        """
+        Returns the ``(path, encoding)`` of the best precompressed variant
+        of ``name`` for ``accepted_encodings``, or ``(path, None)``.
+        """
+        for suffix, encoding, compressor in self.encodings:
+            if encoding in accepted_encodings and self.exists(name + suffix):
+                return self.path(name + suffix), encoding
+        return self.path(name), None
@@ -0,0 +1,177 @@
+"""
+Post tags and their counts.
+
+Tags are attached through PostTag rows, which copy the post's
+created_date so that a tag's posts paginate by keyset on one index range
+(see blog.views.PostTagList).  Every Tag keeps its ``post_count``,
+adjusted with ``F()`` updates whenever tags are added or removed here or
+posts are deleted, so the tag cloud is a single indexed read, cached
+until a count changes.  Always change tags through this module;
+``rebuild`` recounts everything.
+"""
+import collections
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import cache
+from .models import Post, PostTag, Tag
+
+# Tags shown in the cloud, the most used ones.
+CLOUD_SIZE = 30
+
+# Ids per UPDATE, below SQLite's 999 variables limit.
+UPDATE_BATCH_SIZE = 500
+
+
+def parse_tags(text):
+    """
+    Returns the distinct tag names of the comma separated ``text``, in order.
+    """
+    names = collections.OrderedDict()
+    for name in text.split(','):
+        name = ' '.join(name.split())[:Tag._meta.get_field('name').max_length]
+        if slugify(name):
+            names.setdefault(slugify(name), name)
+    return list(names.values())
+
+
+def get_tags(names, using=None):
+    """
+    Returns the Tags named ``names``, creating the missing ones.
+    """
+    using = using or router.db_for_write(Tag)
+    max_length = Tag._meta.get_field('slug').max_length
+    slugs = collections.OrderedDict((slugify(name)[:max_length], name) for name in names)
+    tags = dict((tag.slug, tag) for tag in Tag.objects.using(using).filter(slug__in=list(slugs)))
+    for slug, name in slugs.items():
+        if slug not in tags:
+            try:
+                with transaction.atomic(using=using):
+                    tags[slug] = Tag.objects.using(using).create(name=name, slug=slug)
+            except IntegrityError:
+                # Created concurrently.
+                tags[slug] = Tag.objects.using(using).get(slug=slug)
+    return [tags[slug] for slug in slugs]
+
+
+def _count(tag_ids, delta, using):
+    """
+    Adds ``delta`` to the count of every tag in ``tag_ids``, repeated
+    ids count as many times: one UPDATE per distinct change.
+    """
+    by_delta = collections.defaultdict(list)
+    for tag_id, times in collections.Counter(tag_ids).items():
+        by_delta[delta * times].append(tag_id)
+    for change, ids in by_delta.items():
+        for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+            Tag.objects.using(using).filter(pk__in=ids[start:start + UPDATE_BATCH_SIZE]).update(
+                post_count=F('post_count') + change)
+    if tag_ids:
+        # Once committed, like blog.archive.add.
+        transaction.on_commit(cache.invalidate_tags, using=using)
+
+
+def set_tags(post, names, using=None):
+    """
+    Tags ``post`` with exactly the tags named ``names`` and adjusts the
+    counts of those added or removed.
+    """
+    using = using or router.db_for_write(Post, instance=post)
+    with transaction.atomic(using=using):
+        tags = get_tags(names, using)
+        wanted = set(tag.pk for tag in tags)
+        current = set(PostTag.objects.using(using).filter(post=post).values_list('tag_id', flat=True))
+        removed, added = current - wanted, wanted - current
+        if removed:
+            PostTag.objects.using(using).filter(post=post, tag__in=removed).delete()
+            _count(list(removed), -1, using)
+        if added:
+            PostTag.objects.using(using).bulk_create(
+                [PostTag(post=post, tag_id=tag_id, created_date=post.created_date) for tag_id in added])
+            _count(list(added), 1, using)
+    if added or removed:
+        cache.invalidate_post(post.pk, timezone.now())
+    # Fresh for the post's next render.
+    if hasattr(post, '_prefetched_objects_cache'):
+        post._prefetched_objects_cache.pop('tags', None)
+    return tags
+
+
+def tag_new_posts(tagged, using=None):
+    """
+    Tags each post of the ``(post, names)`` pairs ``tagged``, which have
+    no tags yet, with the tags named ``names``, with one ``bulk_create``,
+    and adjusts the counts.
+    """
+    using = using or router.db_for_write(PostTag)
+    max_length = Tag._meta.get_field('slug').max_length
+    tags = dict((tag.slug, tag) for tag in get_tags(
+        [name for post, names in tagged for name in names], using))
+    post_tags = []
+    for post, names in tagged:
+        tag_ids = set(tags[slugify(name)[:max_length]].pk for name in names)
+        post_tags.extend(PostTag(post=post, tag_id=tag_id, created_date=post.created_date)
+                         for tag_id in tag_ids)
+    if post_tags:
+        PostTag.objects.using(using).bulk_create(post_tags)
+        _count([post_tag.tag_id for post_tag in post_tags], 1, using)
+
+
+def untag_posts(pks, using=None):
+    """
+    Removes every tag of the posts ``pks``, which are about to be deleted
+    without the ORM's cascade, and adjusts the counts.
+    """
+    using = using or router.db_for_write(PostTag)
+    post_tags = PostTag.objects.using(using).filter(post__in=pks)
+    tag_ids = list(post_tags.values_list('tag_id', flat=True))
+    if tag_ids:
+        post_tags._raw_delete(using)
+        _count(tag_ids, -1, using)
+
+
+def sync_dates(pks, using=None):
+    """
+    Copies the created_date of the posts ``pks`` to their PostTag rows.
+    """
+    using = using or router.db_for_write(PostTag)
+    PostTag.objects.using(using).filter(post__in=pks).update(created_date=RawSQL(
+        'SELECT created_date FROM blog_post WHERE blog_post.id = blog_posttag.post_id', []))
+
+
+def cloud():
+    """
+    Returns the most used tags, by name, cached under the tags version.
+    """
+    key = cache.tag_cloud_key()
+    result = cache.get_cache().get(key)
+    if result is None:
+        result = sorted(Tag.objects.filter(post_count__gt=0).order_by('-post_count', '-id')[:CLOUD_SIZE],
+                        key=lambda tag: tag.name.lower())
+        cache.set_page(key, result)
+    return result
+
+
+def rebuild(using=None):
+    """
+    Recounts the posts of every tag and recopies the posts' dates.
+    Returns the number of tags.
+    """
+    using = using or router.db_for_write(Tag)
+    with transaction.atomic(using=using):
+        PostTag.objects.using(using).update(created_date=RawSQL(
+            'SELECT created_date FROM blog_post WHERE blog_post.id = blog_posttag.post_id', []))
+        Tag.objects.using(using).update(post_count=0)
+        by_count = collections.defaultdict(list)
+        for tag_id, count in PostTag.objects.using(using).values_list('tag').annotate(Count('id')).order_by():
+            by_count[count].append(tag_id)
+        for count, ids in by_count.items():
+            for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+                Tag.objects.using(using).filter(pk__in=ids[start:start + UPDATE_BATCH_SIZE]).update(
+                    post_count=count)
+    cache.invalidate_tags()
+    return Tag.objects.using(using).count()
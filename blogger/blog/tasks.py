@@ -0,0 +1,290 @@
+"""
+Background tasks for side work that follows a write.
+
+``enqueue(func, args, key)`` schedules ``func(*args)`` instead of running
+it in the request.  Tasks that share a ``key`` (e.g. one per post)
+coalesce: while one is waiting, enqueueing it again is a no-op, so a
+burst of saves to the same post costs one run.  Tasks only run if the
+write that scheduled them commits.
+
+``BLOG_TASK_BACKEND`` picks where they run:
+
+- ``ThreadBackend`` (default): a pool of ``BLOG_TASK_WORKERS`` threads in
+  each web process, fed once the transaction commits.  Waiting tasks
+  are lost if the process dies.
+- ``DatabaseBackend``: a durable queue in the QueuedTask table, written
+  in the same transaction as the change and run by the ``run_worker``
+  command.  Failed tasks are retried with exponential backoff, up to
+  ``BLOG_TASK_MAX_ATTEMPTS`` times, and then kept for inspection.
+- ``ImmediateBackend``: runs tasks inline on commit, for tests and
+  debugging.
+
+Task functions must be registered with ``@task`` and take JSON
+serializable arguments.
+"""
+import atexit
+import collections
+import json
+import logging
+import os
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from . import prerender
+from .models import QueuedTask
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(func):
+    """
+    Registers ``func`` as a task, under its dotted path.
+    """
+    registry['%s.%s' % (func.__module__, func.__name__)] = func
+    return func
+
+
+def task_name(func):
+    name = '%s.%s' % (func.__module__, func.__name__)
+    if registry.get(name) is not func:
+        raise ValueError("%s is not a registered task." % name)
+    return name
+
+
+def run_task(name, args):
+    registry[name](*args)
+
+
+class ThreadBackend(object):
+    transactional = False
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.condition = threading.Condition()
+        self.pending = collections.OrderedDict()
+        self._pid = None
+
+    def enqueue(self, name, args, key=None):
+        """
+        Queues the task, unless one with the same key is already waiting.
+        Returns whether it was queued.
+        """
+        key = key or (name, json.dumps(args))
+        with self.condition:
+            if key in self.pending:
+                return False
+            self.pending[key] = (name, args)
+            self.condition.notify()
+        self._ensure_threads()
+        return True
+
+    def take(self):
+        with self.condition:
+            if not self.pending:
+                return None
+            return self.pending.popitem(last=False)[1]
+
+    def run_pending(self):
+        """
+        Runs the waiting tasks in this thread, returns how many ran.
+        """
+        count = 0
+        while True:
+            item = self.take()
+            if item is None:
+                return count
+            self._run_one(*item)
+            count += 1
+
+    def clear(self):
+        with self.condition:
+            self.pending.clear()
+
+    def _run_one(self, name, args):
+        try:
+            run_task(name, args)
+        except Exception:
+            logger.exception("Task %s%r failed.", name, tuple(args))
+
+    def _ensure_threads(self):
+        # Also starts them in a forked worker, which doesn't inherit them.
+        if self._pid == os.getpid():
+            return
+        with self.condition:
+            if self._pid == os.getpid():
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name='blog-task-worker-%d' % i)
+                thread.daemon = True
+                thread.start()
+            self._pid = os.getpid()
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                name, args = self.pending.popitem(last=False)[1]
+            try:
+                self._run_one(name, args)
+            finally:
+                # The thread's own connections, unused until the next task.
+                connections.close_all()
+
+
+class ImmediateBackend(object):
+    transactional = False
+
+    def enqueue(self, name, args, key=None):
+        run_task(name, args)
+        return True
+
+
+class DatabaseBackend(object):
+    transactional = True
+
+    def __init__(self, max_attempts=5, lease=300, retry_delay=10):
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.retry_delay = retry_delay
+
+    def enqueue(self, name, args, key=None, using=None):
+        """
+        Inserts the task, unless one with the same key is still waiting.
+        Returns whether it was inserted.
+        """
+        using = using or router.db_for_write(QueuedTask)
+        try:
+            with transaction.atomic(using=using):
+                QueuedTask.objects.using(using).create(
+                    name=name, args=json.dumps(args), key=key, run_after=timezone.now())
+        except IntegrityError:
+            return False
+        return True
+
+    def claim(self, limit=10, using=None):
+        """
+        Locks up to ``limit`` due tasks for this worker for ``lease``
+        seconds and returns them.  Tasks whose worker died are claimed
+        again once their lease ran out.
+        """
+        using = using or router.db_for_write(QueuedTask)
+        now = timezone.now()
+        available = (QueuedTask.objects.using(using)
+                     .filter(run_after__lte=now, attempts__lt=self.max_attempts)
+                     .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now)))
+        pks = list(available.order_by('run_after', 'id').values_list('id', flat=True)[:limit])
+        if not pks:
+            return []
+        token = uuid.uuid4().hex
+        # Other workers may claim some of them in between; the token tells
+        # which this one got.  Clearing the key lets new changes queue the
+        # task again while it runs.
+        available.filter(pk__in=pks).update(
+            locked_by=token, locked_until=now + timedelta(seconds=self.lease), key=None)
+        return list(QueuedTask.objects.using(using).filter(locked_by=token).order_by('run_after', 'id'))
+
+    def run(self, queued_task, using=None):
+        """
+        Runs a claimed task, then deletes it, or schedules a retry if it
+        failed.  Returns whether it succeeded.
+        """
+        using = using or router.db_for_write(QueuedTask)
+        try:
+            run_task(queued_task.name, json.loads(queued_task.args))
+        except Exception:
+            attempts = queued_task.attempts + 1
+            logger.exception("Task %s failed (attempt %d of %d).",
+                             queued_task, attempts, self.max_attempts)
+            QueuedTask.objects.using(using).filter(pk=queued_task.pk).update(
+                attempts=attempts, locked_by='', locked_until=None,
+                run_after=timezone.now() + timedelta(seconds=self.retry_delay * 2 ** (attempts - 1)),
+                last_error=traceback.format_exc())
+            return False
+        QueuedTask.objects.using(using).filter(pk=queued_task.pk).delete()
+        return True
+
+    def run_pending(self, limit=None, batch_size=10, using=None):
+        """
+        Claims and runs due tasks until there are none left (or ``limit``
+        ran), returns how many ran.
+        """
+        count = 0
+        while limit is None or count < limit:
+            claimed = self.claim(batch_size if limit is None else min(batch_size, limit - count), using)
+            if not claimed:
+                break
+            for queued_task in claimed:
+                self.run(queued_task, using)
+                count += 1
+        return count
+
+
+_backends = {}
+
+
+def get_backend():
+    path = getattr(settings, 'BLOG_TASK_BACKEND', 'blog.tasks.ThreadBackend')
+    if path not in _backends:
+        backend_class = import_string(path)
+        if backend_class is ThreadBackend:
+            backend = ThreadBackend(getattr(settings, 'BLOG_TASK_WORKERS', 2))
+        elif backend_class is DatabaseBackend:
+            backend = DatabaseBackend(getattr(settings, 'BLOG_TASK_MAX_ATTEMPTS', 5))
+        else:
+            backend = backend_class()
+        _backends[path] = backend
+    return _backends[path]
+
+
+def enqueue(func, args=(), key=None, using=None):
+    """
+    Runs the task ``func(*args)`` in the background once the current
+    transaction on ``using`` commits, or not at all if it rolls back.
+    """
+    name = task_name(func)
+    args = list(args)
+    backend = get_backend()
+    if backend.transactional:
+        backend.enqueue(name, args, key, using)
+    else:
+        transaction.on_commit(partial(backend.enqueue, name, args, key), using=using)
+
+
+@atexit.register
+def _run_at_exit():
+    # Waiting in-process tasks would otherwise be lost on a clean exit.
+    for backend in _backends.values():
+        if isinstance(backend, ThreadBackend):
+            backend.run_pending()
+
+
+@task
+def regenerate_prerendered(pk, created_date):
+    """
+    Rewrites the pre-rendered pages of post ``pk``, see blog/prerender.py.
+    """
+    prerender.regenerate(pk, parse_datetime(created_date))
+
+
+@task
+def warm_post_pages(pk):
+    """
+    Renders the post's details page and the front list page into the
+    page cache, so the next reader doesn't pay for the miss.
+    """
+    prerender.render(reverse('blog:list'))
+    prerender.render(reverse('blog:details', args=(pk,)))
@@ -0,0 +1,13 @@
+from django import template
+
+from blog import archive
+
+register = template.Library()
+
+
+@register.inclusion_tag('blog/archive_sidebar.html')
+def archive_sidebar():
+    """
+    The months with posts and their counts: one read of ArchiveMonth.
+    """
+    return {'months': archive.months()}
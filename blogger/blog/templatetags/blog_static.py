@@ -0,0 +1,20 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.html import format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def stylesheet_bundle(name):
+    """
+    Links the ``BLOG_STATIC_BUNDLES`` bundle ``name`` once it was built by
+    ``collectstatic``, and each of its parts otherwise (e.g. with DEBUG).
+    """
+    if not settings.DEBUG and name in getattr(staticfiles_storage, 'hashed_files', {}):
+        names = [name]
+    else:
+        names = settings.BLOG_STATIC_BUNDLES[name]
+    return format_html_join('\n', '<link rel="stylesheet" href="{}">',
+                            ((staticfiles_storage.url(part),) for part in names))
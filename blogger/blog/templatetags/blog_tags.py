@@ -0,0 +1,13 @@
+from django import template
+
+from blog import tagging
+
+register = template.Library()
+
+
+@register.inclusion_tag('blog/tag_cloud.html')
+def tag_cloud():
+    """
+    The most used tags: one read of Tag, cached until a count changes.
+    """
+    return {'tags': tagging.cloud()}
@@ -0,0 +1,102 @@
+"""
+Test helpers: bulk factories, query budgets and the parallel runner.
+
+``make_posts`` builds posts through the bulk import (one ``bulk_create``
+per batch, with search, archive and cache kept in step), so scale tests
+can create thousands of posts in well under a second.  ``QueryBudgetMixin``
+adds ``assertMaxQueries``, ``OnCommitMixin`` runs what waits for a commit
+that never comes in a ``TestCase``.  ``ParallelDiscoverRunner`` is the
+``TEST_RUNNER`` of ``blogger.test_settings``: it runs the test classes
+in one process per CPU (``DJANGO_TEST_PROCESSES`` or ``--parallel N``
+to change, ``--parallel 1`` to run serially), each on a copy of the
+in-memory test database.
+"""
+import datetime
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner, default_test_processes
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import bulk, tagging
+from .models import Post, PostTag
+
+
+def make_posts(count, title="Test Post %d", description="Testing Post", start=None,
+               step=datetime.timedelta(minutes=1), tags=(), batch_size=1000):
+    """
+    Creates ``count`` posts, the ``i``-th titled ``title % i`` and created
+    ``i * step`` before ``start`` (now by default), tagged with ``tags``.
+    Returns them in creation order, post 0 being the newest.
+    """
+    start = start or timezone.now()
+    last_pk = Post.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    rows = ({'title': title % i if '%' in title else title, 'description': description,
+             'created_date': (start - i * step).isoformat()} for i in range(count))
+    bulk.import_posts(rows, batch_size)
+    posts = list(Post.objects.filter(id__gt=last_pk).order_by('id'))
+    if tags:
+        tag_posts(posts, tags, batch_size)
+    return posts
+
+
+def tag_posts(posts, names, batch_size=1000):
+    """
+    Tags every post of ``posts`` with the tags named ``names`` with
+    ``bulk_create``, then recounts the tags.
+    """
+    tags = tagging.get_tags(names)
+    PostTag.objects.bulk_create([PostTag(post=post, tag=tag, created_date=post.created_date)
+                                 for post in posts for tag in tags], batch_size)
+    tagging.rebuild()
+
+
+class QueryBudgetMixin(object):
+    def assertMaxQueries(self, budget, using=DEFAULT_DB_ALIAS, msg=None):
+        """
+        Context manager failing if the block runs more than ``budget``
+        queries on ``using``, listing them.
+        """
+        return _AssertMaxQueriesContext(self, budget, connections[using], msg)
+
+
+class OnCommitMixin(object):
+    def run_on_commit(self, using=DEFAULT_DB_ALIAS):
+        """
+        Runs the ``on_commit`` callbacks registered so far, as if the test's
+        transaction had committed.
+        """
+        connection = connections[using]
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for sids, func in callbacks:
+            func()
+
+
+class _AssertMaxQueriesContext(CaptureQueriesContext):
+    def __init__(self, test_case, budget, connection, msg=None):
+        self.test_case = test_case
+        self.budget = budget
+        self.msg = msg
+        super(_AssertMaxQueriesContext, self).__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super(_AssertMaxQueriesContext, self).__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        if len(self) > self.budget:
+            self.test_case.fail("%s%d queries executed, at most %d allowed:\n%s" % (
+                '%s: ' % self.msg if self.msg else '', len(self), self.budget,
+                '\n'.join('%d. %s' % (i, query['sql'])
+                          for i, query in enumerate(self.captured_queries, 1))))
+
+
+class ParallelDiscoverRunner(DiscoverRunner):
+    @classmethod
+    def add_arguments(cls, parser):
+        super(ParallelDiscoverRunner, cls).add_arguments(parser)
+        parser.set_defaults(parallel=default_test_processes())
+
+    def __init__(self, parallel=None, **kwargs):
+        if parallel is None:
+            parallel = default_test_processes()
+        super(ParallelDiscoverRunner, self).__init__(parallel=parallel, **kwargs)
@@ -1,6 +1,6 @@
 from django.conf.urls import url
 
-from . import views
+from . import feeds, views
 
 app_name = 'blog'
 urlpatterns = [
@@ -8,11 +8,38 @@ urlpatterns = [
     url(r'^$', views.PostList.as_view(), name='list'),
     # ex: /blog/5/
     url(r'^(?P<pk>[0-9]+)/$', views.PostDetails.as_view(), name='details'),
+    # ex: /blog/archive/2016/
+    url(r'^archive/(?P<year>[0-9]{4})/$', views.PostArchive.as_view(), name='archive-year'),
+    # ex: /blog/archive/2016/05/
+    url(r'^archive/(?P<year>[0-9]{4})/(?P<month>[0-9]{2})/$', views.PostArchive.as_view(),
+        name='archive-month'),
+    # ex: /blog/tag/django/
+    url(r'^tag/(?P<slug>[-\w]+)/$', views.PostTagList.as_view(), name='tag'),
+    # ex: /blog/popular/
+    url(r'^popular/$', views.PostPopular.as_view(), name='popular'),
+    # ex: /blog/search/?q=django
+    url(r'^search/$', views.PostSearch.as_view(), name='search'),
+    # ex: /blog/api/posts/?since=2016-05-09T22:42:00Z&fields=id,title
+    url(r'^api/posts/$', views.PostStream.as_view(), name='api-posts'),
+    # ex: /blog/feed/rss/
+    url(r'^feed/rss/$', feeds.LatestPostsFeed(), name='feed-rss'),
+    # ex: /blog/feed/atom/
+    url(r'^feed/atom/$', feeds.LatestPostsAtomFeed(), name='feed-atom'),
+    # ex: /blog/sitemap.xml
+    url(r'^sitemap\.xml$', views.SitemapIndex.as_view(), name='sitemap'),
+    # ex: /blog/sitemap-0.xml
+    url(r'^sitemap-(?P<shard>[0-9]+)\.xml$', views.SitemapIndex.as_view(), name='sitemap-shard'),
+    # ex: /blog/stats/
+    url(r'^stats/$', views.PerformanceStats.as_view(), name='stats'),
     # ex: /blog/create/
     url(r'^create/$', views.PostCreate.as_view(), name='create'),
     # ex: /blog/5/edit/
     url(r'^(?P<pk>[0-9]+)/update/$', views.PostUpdate.as_view(), name='update'),
     # ex: /blog/5/delete
     url(r'^(?P<pk>[0-9]+)/delete/$', views.PostDelete.as_view(), name='delete'),
+    # ex: /blog/bulk/update/ (POST ids=1,2,3&description=...)
+    url(r'^bulk/update/$', views.PostBulkUpdate.as_view(), name='bulk-update'),
+    # ex: /blog/bulk/delete/ (POST created_before=2015-01-01)
+    url(r'^bulk/delete/$', views.PostBulkDelete.as_view(), name='bulk-delete'),
 ]
 
@@ -1,22 +1,376 @@
+import json
+import mimetypes
+import os
+from itertools import islice
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseNotModified,
+                         JsonResponse, StreamingHttpResponse)
+from django.utils.http import http_date
+from django.utils.dateparse import parse_datetime
+from django.views.generic import View
+from django.views.generic.base import TemplateView
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.static import was_modified_since
 from django.core.urlresolvers import reverse
-from .models import Post
-from .forms import PostForm
+from django.db.models import Prefetch
+from django.db.models.query import prefetch_related_objects
+from django.shortcuts import get_object_or_404
+from . import archive, bulk, cache, conditional, search, sitemaps
+from .counters import view_counter
+from .models import Post, PostTag, Tag
+from .forms import PostBulkUpdateForm, PostForm, PostSelectionForm
+from .metrics import admission_stats, request_stats
+from .pagination import (AFTER, InvalidCursor, decode_cursor, encode_cursor,
+                         keyset_iterate, keyset_paginate)
+
+class CachedPageMixin(object):
+    """
+    Serves GET requests from the versioned page cache (see blog/cache.py),
+    only reaching the database and the template engine on a miss.
+    """
+    def get_page_cache_key(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_page_cache_key()
+        content = cache.get_page(key)
+        if content is not None:
+            return HttpResponse(content)
+        response = super(CachedPageMixin, self).get(request, *args, **kwargs)
+        response.add_post_render_callback(lambda r: cache.set_page(key, r.content))
+        return response
 
-class PostList(ListView):
+class PostList(CachedPageMixin, ListView):
     template_name = 'blog/list.html'
     context_object_name = 'latest_post_list'
+    paginate_by = 10
+
+    @method_decorator(condition(etag_func=conditional.list_etag,
+                                last_modified_func=conditional.list_last_modified))
+    def get(self, request, *args, **kwargs):
+        return super(PostList, self).get(request, *args, **kwargs)
 
     def get_queryset(self):
-        return Post.objects.order_by('-created_date')[:10]
+        # Only what list.html shows, plus the pagination key, and the tags
+        # of the whole page in one more query.
+        return (Post.objects.only('id', 'title', 'created_date').order_by('-created_date', '-id')
+                .prefetch_related(Prefetch('tags', queryset=Tag.objects.only('name', 'slug'))))
 
-class PostDetails(DetailView):
-    model = Post
+    def paginate_queryset(self, queryset, page_size):
+        try:
+            page = keyset_paginate(queryset, self.request.GET.get('cursor'), page_size)
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_page_cache_key(self):
+        return cache.list_page_key(self.request.GET.get('cursor'))
+
+class PostArchive(PostList):
+    """
+    The posts of a year or month, paginated like PostList.
+    """
+    def get_queryset(self):
+        year, month = int(self.kwargs['year']), self.kwargs.get('month')
+        month = int(month) if month else None
+        if not 1 <= (month or 1) <= 12 or not 1 <= year <= 9998:
+            raise Http404("Invalid date.")
+        self.archive_start, end = archive.month_range(year, month)
+        self.archive_format = 'F Y' if month else 'Y'
+        return super(PostArchive, self).get_queryset().filter(
+            created_date__gte=self.archive_start, created_date__lt=end)
+
+    def get_context_data(self, **kwargs):
+        context = super(PostArchive, self).get_context_data(**kwargs)
+        context.update({'archive_date': self.archive_start, 'archive_format': self.archive_format})
+        return context
+
+    def get_page_cache_key(self):
+        return cache.archive_page_key(self.kwargs['year'], self.kwargs.get('month'),
+                                      self.request.GET.get('cursor'))
+
+class PostTagList(PostList):
+    """
+    The posts of a tag, paginated like PostList but over the tag's
+    PostTag rows, whose copy of created_date keeps every page one range
+    of their index.
+    """
+    def get_queryset(self):
+        # Not before, cached pages need no query at all.
+        self.tag = get_object_or_404(Tag, slug=self.kwargs['slug'])
+        return (PostTag.objects.filter(tag=self.tag).select_related('post')
+                .only('id', 'created_date', 'post__id', 'post__title', 'post__created_date'))
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, post_tags, is_paginated = super(PostTagList, self).paginate_queryset(
+            queryset, page_size)
+        page.object_list = [post_tag.post for post_tag in post_tags]
+        prefetch_related_objects(page.object_list,
+                                 [Prefetch('tags', queryset=Tag.objects.only('name', 'slug'))])
+        return paginator, page, page.object_list, is_paginated
+
+    def get_context_data(self, **kwargs):
+        context = super(PostTagList, self).get_context_data(**kwargs)
+        context['tag'] = self.tag
+        return context
+
+    def get_page_cache_key(self):
+        return cache.tag_page_key(self.kwargs['slug'], self.request.GET.get('cursor'))
+
+class PostDetails(CachedPageMixin, DetailView):
+    queryset = Post.objects.select_related('post_body').prefetch_related('tags')
     template_name = 'blog/details.html'
 
+    @method_decorator(condition(etag_func=conditional.post_etag,
+                                last_modified_func=conditional.post_last_modified))
+    def get(self, request, *args, **kwargs):
+        response = super(PostDetails, self).get(request, *args, **kwargs)
+        if not getattr(request, 'is_prerender', False):
+            view_counter.add(self.kwargs['pk'])
+        return response
+
+    def get_page_cache_key(self):
+        return cache.post_page_key(self.kwargs['pk'])
+
+class PostPopular(ListView):
+    """
+    The most read posts.  View counts lag behind by up to a flush interval
+    (see blog/counters.py).
+    """
+    template_name = 'blog/popular.html'
+    context_object_name = 'popular_post_list'
+    size = 10
+
+    def get_queryset(self):
+        return Post.objects.only('id', 'title', 'view_count').order_by('-view_count', '-id')[:self.size]
+
+class PostSearch(TemplateView):
+    template_name = 'blog/search.html'
+    paginate_by = 10
+
+    def get_context_data(self, **kwargs):
+        context = super(PostSearch, self).get_context_data(**kwargs)
+        q = self.request.GET.get('q', '').strip()
+        try:
+            page = search.search(q, self.request.GET.get('cursor'), self.paginate_by)
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        context.update({'q': q, 'page_obj': page, 'results': page.object_list})
+        return context
+
+class PostStream(View):
+    """
+    Read-only API streaming posts oldest first, as NDJSON (one post per
+    line) or with ``?format=json`` as a single chunked JSON document.
+
+    - ``fields``: comma separated subset of ``fields`` to return.
+    - ``since``: only posts created after this ISO 8601 datetime.
+    - ``cursor``: resume after the post that carried this cursor.
+    - ``limit``: stop after this many posts.
+
+    Every post carries the ``cursor`` to resume after it, and the JSON
+    document ends with the ``next`` cursor when ``limit`` cut it short.
+    Rows are read in keyset chunks and written as they arrive, so the
+    first bytes go out at once and memory stays flat.
+    """
+    fields = ('id', 'title', 'description', 'created_date', 'modified_date')
+    chunk_size = 1000
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'json': 'application/json',
+    }
+
+    def get(self, request, *args, **kwargs):
+        try:
+            format, fields, queryset, after, limit = self.parse(request.GET)
+        except (ValueError, InvalidCursor) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        rows = keyset_iterate(queryset, after, min(limit + 1 if limit else self.chunk_size,
+                                                  self.chunk_size))
+        if limit:
+            rows = islice(rows, limit + 1)
+        stream = getattr(self, 'stream_' + format)(self.serialize(rows, fields, limit))
+        return StreamingHttpResponse(stream, content_type=self.content_types[format])
+
+    def parse(self, params):
+        format = params.get('format', 'ndjson')
+        if format not in self.content_types:
+            raise ValueError("Unknown format %r." % format)
+        fields = [field for field in params.get('fields', '').split(',') if field] or self.fields
+        unknown = set(fields) - set(self.fields)
+        if unknown:
+            raise ValueError("Unknown fields: %s." % ', '.join(sorted(unknown)))
+        queryset = Post.objects.values(*set(fields) | set(['id', 'created_date']))
+        if params.get('since'):
+            since = parse_datetime(params['since'])
+            if since is None:
+                raise ValueError("Invalid since datetime.")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since, timezone.utc)
+            queryset = queryset.filter(created_date__gt=since)
+        after = None
+        if params.get('cursor'):
+            direction, created_date, pk = decode_cursor(params['cursor'])
+            if direction != AFTER:
+                raise InvalidCursor(params['cursor'])
+            after = (created_date, pk)
+        limit = int(params.get('limit') or 0)
+        if limit < 0:
+            raise ValueError("Invalid limit.")
+        return format, fields, queryset, after, limit
+
+    def serialize(self, rows, fields, limit):
+        """
+        Yields ``(post, next_cursor)`` pairs, where ``next_cursor`` is only
+        set on the last post when ``limit`` cut the stream short.
+        """
+        previous = None
+        for count, row in enumerate(rows, 1):
+            if limit and count > limit:
+                yield previous, previous['cursor']
+                return
+            if previous is not None:
+                yield previous, None
+            previous = dict((field, row[field]) for field in fields)
+            previous['cursor'] = encode_cursor(row['created_date'], row['id'], AFTER)
+        if previous is not None:
+            yield previous, None
+
+    def stream_ndjson(self, posts):
+        for post, next_cursor in posts:
+            yield json.dumps(post, cls=DjangoJSONEncoder) + '\n'
+
+    def stream_json(self, posts):
+        yield '{"results": ['
+        separator = ''
+        next_cursor = None
+        for post, next_cursor in posts:
+            yield separator + json.dumps(post, cls=DjangoJSONEncoder)
+            separator = ', '
+        yield '], "next": %s}' % json.dumps(next_cursor)
+
+@method_decorator(staff_member_required, name='dispatch')
+class PerformanceStats(TemplateView):
+    template_name = 'blog/stats.html'
+
+    def get_context_data(self, **kwargs):
+        context = super(PerformanceStats, self).get_context_data(**kwargs)
+        context.update({
+            'endpoints': request_stats.endpoints(),
+            'slow_queries': request_stats.slowest_queries(),
+            'cache_stats': cache.stats(),
+            'admission_stats': admission_stats.summary(),
+        })
+        return context
+
+@method_decorator(staff_member_required, name='dispatch')
+class PostBulkChange(View):
+    """
+    Applies one change to many posts, selected by ``ids`` (comma
+    separated) and/or a ``created_after``/``created_before`` range, in a
+    single transaction of batched set-based queries (see blog/bulk.py),
+    and answers with the number of posts changed as JSON.
+    """
+    form_class = None
+    result_name = None
+
+    def post(self, request, *args, **kwargs):
+        form = self.form_class(request.POST)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        return JsonResponse({self.result_name: self.apply(form)})
+
+    def apply(self, form):
+        raise NotImplementedError
+
+class PostBulkUpdate(PostBulkChange):
+    form_class = PostBulkUpdateForm
+    result_name = 'updated'
+
+    def apply(self, form):
+        return bulk.update_posts(form.get_queryset(), form.get_values(), atomic=True)
+
+class PostBulkDelete(PostBulkChange):
+    form_class = PostSelectionForm
+    result_name = 'deleted'
+
+    def apply(self, form):
+        return bulk.delete_posts(form.get_queryset(), atomic=True)
+
+class SitemapIndex(View):
+    """
+    The sitemap index, and with ``shard`` one of its shards, served from
+    the cache (see blog/sitemaps.py).
+    """
+    def get(self, request, shard=None):
+        base_url = '%s://%s' % (request.scheme, request.get_host())
+        if shard is None:
+            content = sitemaps.get_index(base_url, request.get_host())
+        else:
+            content = sitemaps.get_shard(int(shard), base_url, request.get_host())
+            if content is None:
+                raise Http404("No such sitemap.")
+        return HttpResponse(content, content_type='application/xml')
+
+class StaticAsset(View):
+    """
+    Serves collected static files, picking the precompressed variant built
+    by ``blog.storage.CompressedManifestStaticFilesStorage`` that the client
+    accepts.  Fingerprinted names never change content, so they are cached
+    for a year; anything else only briefly.
+    """
+    immutable_cache_control = 'public, max-age=31536000, immutable'
+    cache_control = 'public, max-age=300'
+
+    def get(self, request, path):
+        try:
+            if not staticfiles_storage.exists(path) or os.path.isdir(staticfiles_storage.path(path)):
+                raise Http404
+        except SuspiciousFileOperation:
+            raise Http404
+        accepted = self.accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if hasattr(staticfiles_storage, 'precompressed'):
+            fullpath, encoding = staticfiles_storage.precompressed(path, accepted)
+        else:
+            fullpath, encoding = staticfiles_storage.path(path), None
+        stat = os.stat(fullpath)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                                  stat.st_mtime, stat.st_size):
+            return HttpResponseNotModified()
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Content-Length'] = stat.st_size
+        response['Vary'] = 'Accept-Encoding'
+        if encoding:
+            response['Content-Encoding'] = encoding
+        is_immutable = getattr(staticfiles_storage, 'is_immutable', lambda name: False)
+        response['Cache-Control'] = (
+            self.immutable_cache_control if is_immutable(path) else self.cache_control)
+        return response
+
+    def accepted_encodings(self, header):
+        encodings = set()
+        for part in header.split(','):
+            params = part.strip().split(';')
+            quality = [param.strip() for param in params[1:] if param.strip().startswith('q=')]
+            try:
+                if quality and float(quality[0][2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+            encodings.add(params[0].strip().lower())
+        return encodings
+
 class PostCreate(CreateView):
     form_class = PostForm
     template_name = 'blog/create.html'
@@ -26,7 +380,7 @@ class PostCreate(CreateView):
         return super(PostCreate, self).form_valid(form)
 
 class PostUpdate(UpdateView):
-    model = Post
+    queryset = Post.objects.select_related('post_body')
     form_class = PostForm
     template_name = 'blog/update.html'
 
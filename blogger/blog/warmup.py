@@ -0,0 +1,163 @@
+"""
+Warm-up of a fresh worker, run when blogger.wsgi is imported.
+
+A new process builds everything lazily: the URL resolvers compile their
+patterns on the first ``reverse()``, templates are read and compiled on
+first use, the staticfiles manifest is read on the first ``{% static %}``
+and the first query opens the database connection.  ``warm_up`` does all
+of that before the worker accepts requests, so its first response costs
+the same as the next ones.  Templates only stay compiled with the cached
+loader, which ``BLOG_CACHED_TEMPLATES`` enables; without it, compiling
+them ahead is skipped.
+
+Connections are opened in the importing thread and kept for
+``CONN_MAX_AGE``, which is what a synchronous worker serves from.  With
+a server that imports the application before forking (``--preload``),
+set ``BLOG_WARMUP_CONNECTIONS = False``: forked workers must not share
+them.  ``BLOG_WARMUP = False`` turns the whole warm-up off.
+"""
+import logging
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.urlresolvers import NoReverseMatch, get_resolver, reverse
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.loader import get_template
+from django.template.loaders.cached import Loader as CachedLoader
+from django.utils import six
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+# Arguments to reverse the blog routes with, by group name.
+SAMPLE_KWARGS = {
+    'pk': 1,
+    'year': '2016',
+    'month': '01',
+    'slug': 'warm-up',
+    'shard': 0,
+}
+
+
+def reverse_urls(namespace='blog'):
+    """
+    Compiles the URL resolvers by reversing every named route of
+    ``namespace``.  Returns the number of names reversed.
+    """
+    resolver = get_resolver(None)
+    # Compiles the root patterns, and the namespace's on the way.
+    resolver.reverse_dict
+    prefix, namespace_resolver = resolver.namespace_dict[namespace]
+    count = 0
+    for name in namespace_resolver.reverse_dict:
+        if not isinstance(name, six.string_types):
+            continue
+        for possibility, pattern, defaults in namespace_resolver.reverse_dict.getlist(name):
+            params = possibility[0][1]
+            try:
+                reverse('%s:%s' % (namespace, name),
+                        kwargs=dict((param, SAMPLE_KWARGS.get(param, 1)) for param in params))
+            except NoReverseMatch:
+                logger.debug("Could not reverse %s:%s to warm it up.", namespace, name)
+            else:
+                count += 1
+            break
+    return count
+
+
+def template_names(app_label='blog'):
+    directory = os.path.join(apps.get_app_config(app_label).path, 'templates')
+    for root, dirnames, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            if filename.endswith(('.html', '.txt', '.xml')):
+                yield os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/')
+
+
+def templates_cached():
+    """
+    Whether compiled templates are kept, i.e. a Django template engine
+    uses the cached loader.
+    """
+    return any(isinstance(loader, CachedLoader)
+               for engine in engines.all() if hasattr(engine, 'engine')
+               for loader in engine.engine.template_loaders)
+
+
+def compile_templates(app_label='blog'):
+    """
+    Loads every template of the app, and so the templates they extend and
+    include, into the cached loader.  Returns the number loaded, 0 without
+    the cached loader: they would be thrown away.
+    """
+    if not templates_cached():
+        logger.info("Templates are not cached (BLOG_CACHED_TEMPLATES is off), not compiling them.")
+        return 0
+    count = 0
+    for name in template_names(app_label):
+        try:
+            get_template(name)
+        except (TemplateDoesNotExist, TemplateSyntaxError):
+            logger.exception("Could not compile %s to warm it up.", name)
+        else:
+            count += 1
+    return count
+
+
+def load_static_manifest():
+    # Read on first use by ManifestStaticFilesStorage.
+    if hasattr(staticfiles_storage, 'hashed_files'):
+        return len(staticfiles_storage.hashed_files)
+    return 0
+
+
+def open_connections():
+    """
+    Opens the connections to the primary and the replicas.  Returns the
+    number opened.
+    """
+    aliases = [DEFAULT_DB_ALIAS] + list(getattr(settings, 'BLOG_REPLICA_DATABASES', []))
+    for alias in aliases:
+        connections[alias].ensure_connection()
+    return len(aliases)
+
+
+def connect_cache():
+    cache.get_cache().get('blog:warmup')
+    return 1
+
+
+STEPS = [
+    ('urls', reverse_urls),
+    ('templates', compile_templates),
+    ('static', load_static_manifest),
+    ('cache', connect_cache),
+    ('connections', open_connections),
+]
+
+
+def warm_up():
+    """
+    Runs every warm-up step, returns a dict of the seconds each took.
+    A failing step is logged and skipped, it never keeps a worker from
+    starting.
+    """
+    timings = {}
+    if not getattr(settings, 'BLOG_WARMUP', True):
+        return timings
+    for name, step in STEPS:
+        if name == 'connections' and not getattr(settings, 'BLOG_WARMUP_CONNECTIONS', True):
+            continue
+        start = time.time()
+        try:
+            count = step()
+        except Exception:
+            logger.exception("Warm-up step %s failed.", name)
+            continue
+        timings[name] = time.time() - start
+        logger.debug("Warmed up %d %s in %.1fms.", count, name, timings[name] * 1000)
+    return timings
@@ -41,6 +41,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE_CLASSES = [
+    'blog.middleware.PerformanceMiddleware',
+    'blog.middleware.ReplicaPinningMiddleware',
+    'blog.middleware.AdmissionControlMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,7 +60,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -65,10 +67,25 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
         },
     },
 ]
 
+# Compiled templates are kept for the life of the worker, and compiled at
+# start up by the warm-up (see blog/warmup.py).  Also with DEBUG on; set
+# BLOG_CACHED_TEMPLATES=0 in the environment to see template edits without
+# restarting the server.
+BLOG_CACHED_TEMPLATES = os.environ.get('BLOG_CACHED_TEMPLATES', '1') != '0'
+
+if BLOG_CACHED_TEMPLATES:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', TEMPLATES[0]['OPTIONS']['loaders']),
+    ]
+
 WSGI_APPLICATION = 'blogger.wsgi.application'
 
 
@@ -79,9 +96,129 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+    },
+    # Read replicas are added next to the primary and listed in
+    # BLOG_REPLICA_DATABASES, e.g. a copy of db.sqlite3 kept in sync by
+    # litestream:
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.sqlite3',
+    #     'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+    #     'CONN_MAX_AGE': 60,
+    #     'TEST': {'MIRROR': 'default'},
+    # },
+}
+
+DATABASE_ROUTERS = ['blog.routers.PrimaryReplicaRouter']
+
+BLOG_REPLICA_DATABASES = []
+
+# Seconds a client's reads stay on the primary after it wrote.
+BLOG_REPLICA_PIN_SECONDS = 5
+
+BLOG_SQLITE_WAL = True
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+# Rendered blog pages are cached with versioned keys (see blog/cache.py), so
+# any backend works, e.g. 'django.core.cache.backends.filebased.FileBasedCache'
+# with a LOCATION to share the cache between worker processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blogger',
     }
 }
 
+BLOG_CACHE_ALIAS = 'default'
+
+BLOG_CACHE_TIMEOUT = 60 * 60
+
+
+# Request instrumentation (see blog/middleware.py)
+# Fraction of requests whose queries and template rendering are timed and
+# recorded; keep it low in production.  Set the environment variable of the
+# same name, e.g. to 1.0 while profiling.
+
+BLOG_PERF_SAMPLE_RATE = float(os.environ.get('BLOG_PERF_SAMPLE_RATE', '0.01'))
+
+BLOG_PERF_WINDOW = 1000
+
+BLOG_PERF_SLOW_QUERY_MS = 50
+
+BLOG_PERF_SLOW_QUERY_LOG = 100
+
+
+# Static pre-rendering (see blog/prerender.py)
+# Directory the public pages are written to for the front-end server, None
+# to disable regenerating them on every change.
+
+BLOG_PRERENDER_ROOT = None
+
+# Newest list pages rewritten after every change.
+BLOG_PRERENDER_FRONT_PAGES = 5
+
+
+# Sitemap (see blog/sitemaps.py)
+# Posts per shard, by id range; 50,000 is the protocol's limit.
+
+BLOG_SITEMAP_SHARD_SIZE = 50000
+
+
+# Background tasks (see blog/tasks.py)
+# ThreadBackend runs them in each web process, DatabaseBackend queues them
+# durably for the run_worker command.
+
+BLOG_TASK_BACKEND = 'blog.tasks.ThreadBackend'
+
+# Threads per process of the ThreadBackend.
+BLOG_TASK_WORKERS = 2
+
+# Runs of a failing DatabaseBackend task before it is left in the queue.
+BLOG_TASK_MAX_ATTEMPTS = 5
+
+# Render a saved post's details page and the front page into the cache.
+BLOG_WARM_PAGES = False
+
+
+# View counters (see blog/counters.py)
+# Views are buffered per worker and written every BLOG_VIEW_FLUSH_INTERVAL
+# seconds, or once BLOG_VIEW_FLUSH_SIZE views are buffered.
+
+BLOG_VIEW_FLUSH_INTERVAL = 10
+
+BLOG_VIEW_FLUSH_SIZE = 1000
+
+
+# Write admission control (see blog/admission.py)
+# Writes each client may send at once, then per second; None to disable.
+
+BLOG_ADMISSION_BURST = 10
+
+BLOG_ADMISSION_RATE = 1.0
+
+# Writes in flight per worker process, None to disable; SQLite runs one at
+# a time anyway.  Up to BLOG_ADMISSION_QUEUE more wait for a slot, for at
+# most BLOG_ADMISSION_QUEUE_TIMEOUT seconds.
+BLOG_ADMISSION_MAX_WRITES = 4
+
+BLOG_ADMISSION_QUEUE = 8
+
+BLOG_ADMISSION_QUEUE_TIMEOUT = 1.0
+
+
+# Worker warm-up (see blog/warmup.py)
+# Compile the URL resolvers and templates and open the connections when the
+# WSGI application is imported, before the first request.
+
+BLOG_WARMUP = True
+
+# Leave connections closed when the server forks after importing the
+# application (e.g. gunicorn --preload).
+BLOG_WARMUP_CONNECTIONS = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
@@ -120,3 +257,15 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.9/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# Where collectstatic gathers the files, served by blog.views.StaticAsset
+# (or, better, by the front-end web server straight from this directory).
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# Bundles, fingerprints and gzips static files at collectstatic time.
+STATICFILES_STORAGE = 'blog.storage.CompressedManifestStaticFilesStorage'
+
+# Bundle name: the files concatenated into it, in order.
+BLOG_STATIC_BUNDLES = {
+    'css/blog.bundle.css': ['css/bootstrap.min.css', 'css/blog.css'],
+}
@@ -0,0 +1,35 @@
+"""
+Settings for the test suite, used by ``manage.py test``.
+
+Tests run on an in-memory SQLite database (copied into every worker of
+the parallel runner) with a fast password hasher, and background tasks
+run inline.  Every request is sampled for the metrics, and writes are not
+rate limited per client.
+"""
+from .settings import *  # noqa
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blogger-tests',
+    }
+}
+
+BLOG_TASK_BACKEND = 'blog.tasks.ImmediateBackend'
+
+# Every request is instrumented, so tests see their metrics.
+BLOG_PERF_SAMPLE_RATE = 1.0
+
+# Every test client writes from the same address.
+BLOG_ADMISSION_RATE = None
+
+TEST_RUNNER = 'blog.testing.ParallelDiscoverRunner'
@@ -14,10 +14,16 @@ Including another URLconf
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
 
+import re
+
+from django.conf import settings
 from django.conf.urls import include, url
 from django.contrib import admin
 
+from blog.views import StaticAsset
+
 urlpatterns = [
     url(r'^blog/', include('blog.urls')),
     url(r'^admin/', admin.site.urls),
-]
\ No newline at end of file
+    url(r'^%s(?P<path>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')), StaticAsset.as_view()),
+]
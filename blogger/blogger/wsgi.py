@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogger.settings")
 
 application = get_wsgi_application()
+
+# Builds the URL resolvers, templates and connections before the first
+# request rather than during it.
+from blog.warmup import warm_up  # noqa: E402
+
+warm_up()